@@ -0,0 +1,171 @@
+import os
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+import sys
+import csv
+import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pygame
+
+import generate_noise_image as game
+
+
+STATS_FIELDS = (
+    'seed', 'tier', 'chunks', 'width', 'platforms', 'walls', 'enemies',
+    'gap_min', 'gap_mean', 'gap_p50', 'gap_p90', 'gap_max',
+    'height_mean', 'height_variance', 'height_min', 'height_max', 'rise_max', 'boundary_rise_max',
+) + tuple(f'enemies_{name}' for name in game.ENEMY_TYPES) + ('image',)
+
+export_options = None
+
+
+def init_worker(options):
+    global export_options
+    export_options = options
+    game.NOISE_SCALE = options['noise_scale']
+    game.OCTAVES = options['octaves']
+    game.current_theme_index = options['theme']
+    game.update_colors_from_theme()
+
+
+def build_level(seed, chunk_count, tier):
+    world = game.make_world_params(seed, tier)
+    chunks = {i: game.generate_chunk(i, world) for i in range(chunk_count)}
+    level_platforms = [p for i in range(chunk_count) for p in chunks[i][0]]
+    level_walls = [w for i in range(chunk_count) for w in chunks[i][1]]
+    level_enemies = [e for i in range(chunk_count) for e in chunks[i][2]]
+    return chunks, level_platforms, level_walls, level_enemies
+
+
+def render_level(chunks, level_enemies, scale):
+    world_chunks = {i: (chunk_platforms, chunk_walls) for i, (chunk_platforms, chunk_walls, _) in chunks.items()}
+
+    landscape = pygame.Surface((len(chunks) * game.CHUNK_WIDTH, game.SCREEN_HEIGHT))
+    for i in chunks:
+        landscape.blit(game.build_terrain_strip(world_chunks, i), (i * game.CHUNK_WIDTH, 0))
+    for enemy in level_enemies:
+        rect = pygame.Rect(enemy.x, enemy.y, game.ENEMY_WIDTH, game.ENEMY_HEIGHT)
+        game.blit_sprite(landscape, game.ENEMY_DRAWERS[enemy.type], rect, game.COLORS[game.ENEMY_COLOR_KEYS[enemy.type]])
+
+    if scale != 1:
+        size = (max(1, int(landscape.get_width() * scale)), max(1, int(landscape.get_height() * scale)))
+        landscape = pygame.transform.smoothscale(landscape, size)
+    return landscape
+
+
+def level_stats(seed, chunk_count, tier, chunks, level_platforms, level_walls, level_enemies):
+    ordered = sorted(level_platforms, key=lambda p: p.left)
+    gaps = np.array([b.left - a.right for a, b in zip(ordered, ordered[1:])], dtype=np.float64)
+    rises = [a.top - b.top for a, b in zip(ordered, ordered[1:])]
+    boundary_rises = [chunks[i][0][-1].top - chunks[i + 1][0][0].top
+                      for i in range(chunk_count - 1) if chunks[i][0] and chunks[i + 1][0]]
+    heights = np.array([p.top for p in level_platforms], dtype=np.float64)
+    enemy_types = np.bincount([e.type for e in level_enemies], minlength=len(game.ENEMY_TYPES))
+
+    stats = {
+        'seed': seed,
+        'tier': tier,
+        'chunks': chunk_count,
+        'width': chunk_count * game.CHUNK_WIDTH,
+        'platforms': len(level_platforms),
+        'walls': len(level_walls),
+        'enemies': len(level_enemies),
+        'gap_min': float(gaps.min()) if gaps.size else 0.0,
+        'gap_mean': round(float(gaps.mean()), 2) if gaps.size else 0.0,
+        'gap_p50': float(np.percentile(gaps, 50)) if gaps.size else 0.0,
+        'gap_p90': round(float(np.percentile(gaps, 90)), 2) if gaps.size else 0.0,
+        'gap_max': float(gaps.max()) if gaps.size else 0.0,
+        'height_mean': round(float(heights.mean()), 2),
+        'height_variance': round(float(heights.var()), 2),
+        'height_min': float(heights.min()),
+        'height_max': float(heights.max()),
+        'rise_max': max(rises, default=0),
+        'boundary_rise_max': max(boundary_rises, default=0),
+    }
+    for name, count in zip(game.ENEMY_TYPES, enemy_types):
+        stats[f'enemies_{name}'] = int(count)
+    return stats
+
+
+def export_seed(seed):
+    chunk_count = export_options['chunks']
+    tier = export_options['tier']
+    chunks, level_platforms, level_walls, level_enemies = build_level(seed, chunk_count, tier)
+    stats = level_stats(seed, chunk_count, tier, chunks, level_platforms, level_walls, level_enemies)
+
+    stats['image'] = ''
+    if not export_options['no_images']:
+        image_path = os.path.join(export_options['output'], f"seed_{seed}.png")
+        pygame.image.save(render_level(chunks, level_enemies, export_options['scale']), image_path)
+        stats['image'] = os.path.basename(image_path)
+    return stats
+
+
+def positive_int_arg(text):
+    value = int(text)
+    if value < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {value}")
+    return value
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a range of seeds in parallel and export landscape images and stats.")
+    parser.add_argument("start", type=int, help="first map seed")
+    parser.add_argument("stop", type=int, help="last map seed (exclusive)")
+    parser.add_argument("--output", default="landscapes", help="output directory")
+    parser.add_argument("--chunks", type=positive_int_arg, default=8, help="chunks per landscape, each one screen wide")
+    parser.add_argument("--tier", type=int, default=0, choices=range(len(game.DIFFICULTY_TIERS)), help="difficulty tier")
+    parser.add_argument("--noise-scale", type=float, default=game.NOISE_SCALE)
+    parser.add_argument("--octaves", type=int, default=game.OCTAVES)
+    parser.add_argument("--theme", type=int, default=0, choices=range(len(game.COLOR_THEMES)), help="color theme")
+    parser.add_argument("--scale", type=float, default=0.25, help="image scale factor")
+    parser.add_argument("--no-images", action="store_true", help="only write the stats")
+    parser.add_argument("--workers", type=positive_int_arg, default=os.cpu_count(), help="worker processes")
+    parser.add_argument("--check-jumps", action="store_true",
+                        help="exit with status 1 if any step up to the next platform is higher than the player can jump")
+    args = parser.parse_args()
+
+    os.makedirs(args.output, exist_ok=True)
+    options = {
+        'output': args.output,
+        'chunks': args.chunks,
+        'tier': args.tier,
+        'noise_scale': args.noise_scale,
+        'octaves': args.octaves,
+        'theme': args.theme,
+        'scale': args.scale,
+        'no_images': args.no_images,
+    }
+    seeds = range(args.start, args.stop)
+
+    start_time = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=init_worker, initargs=(options,)) as executor:
+        rows = list(executor.map(export_seed, seeds, chunksize=max(1, len(seeds) // (args.workers * 4))))
+    elapsed = time.perf_counter() - start_time
+
+    with open(os.path.join(args.output, 'stats.csv'), 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=STATS_FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+    with open(os.path.join(args.output, 'stats.json'), 'w') as f:
+        json.dump({'options': options, 'levels': rows}, f, indent=2)
+
+    print(f"Exported {len(rows)} seeds to {args.output} in {elapsed:.2f}s with {args.workers} workers.", file=sys.stderr)
+
+    if args.check_jumps:
+        unreachable = [row for row in rows if max(row['rise_max'], row['boundary_rise_max']) > game.JUMP_HEIGHT]
+        for row in unreachable:
+            print(f"Seed {row['seed']}: rise of {row['rise_max']} px inside chunks, {row['boundary_rise_max']} px "
+                  f"across chunks, jump height {game.JUMP_HEIGHT:.1f} px", file=sys.stderr)
+        if unreachable:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+import os
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+import sys
+import json
+import time
+import argparse
+import contextlib
+import platform
+import itertools
+import statistics
+
+import numpy as np
+import pygame
+
+import generate_noise_image as game
+
+
+DEFAULT_BASELINE = 'benchmark_baseline.json'
+DEFAULT_THRESHOLD = 0.25
+TARGET_REPEAT_SECONDS = 0.05
+REPEAT = 7
+
+WORLD_CHUNKS = (4, 16, 64)
+ENEMY_COUNTS = (10, 100, 1000)
+LASER_COUNTS = (8, 64, 256)
+TONE_DURATIONS_MS = (50, 200, 1000)
+TEXT_LINES = (10, 50, 200)
+SFX_NAMES = ('shoot', 'hurt', 'death')
+
+
+def measure(fn, setup=None):
+    if setup:
+        setup()
+    fn()
+    if setup:
+        setup()
+    start = time.perf_counter()
+    fn()
+    once = time.perf_counter() - start
+    number = max(1, int(TARGET_REPEAT_SECONDS / max(once, 1e-9)))
+
+    times = []
+    for _ in range(REPEAT):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        times.append((time.perf_counter() - start) / number)
+    return {
+        "median_ms": round(statistics.median(times) * 1000, 5),
+        "min_ms": round(min(times) * 1000, 5),
+        "loops": number,
+    }
+
+
+def new_world(seed=1):
+    sim = game.SimState(seed)
+    sim.current_map_seed = seed
+    game.generate_platforms_and_walls(sim)
+    return sim
+
+def fill_enemies(sim, count, seed=1):
+    rng = np.random.default_rng(seed)
+    sim.enemy_store.clear()
+    for i in range(count):
+        enemy_class = game.ENEMY_CLASSES[int(rng.integers(len(game.ENEMY_TYPES)))]
+        sim.enemy_store.add(enemy_class(0, float(rng.uniform(0, game.CHUNK_WIDTH * 4)), float(rng.uniform(0, game.SCREEN_HEIGHT)),
+                                        game.ENEMY_SPEED, walk_end_x=game.CHUNK_WIDTH * 4, jump_cooldown=120))
+
+def snapshot_enemies(sim):
+    store = sim.enemy_store
+    return store.count, [(getattr(store, name), getattr(store, name).copy()) for name, _ in store.FIELDS]
+
+def restore_enemies(sim, snapshot):
+    count, columns = snapshot
+    for column, saved in columns:
+        np.copyto(column, saved)
+    sim.enemy_store.count = count
+
+def fill_lasers(sim, count, seed=2):
+    rng = np.random.default_rng(seed)
+    sim.laser_pool.clear()
+    for _ in range(count):
+        sim.laser_pool.fire(rng.uniform(0, game.SCREEN_WIDTH), rng.uniform(0, game.SCREEN_HEIGHT), 0, 0)
+
+
+def bench_generation():
+    results = {}
+    world = game.current_world_params(new_world())
+    for chunks in WORLD_CHUNKS:
+        results[f"generation.chunks={chunks}"] = measure(lambda: [game.generate_chunk(i, world) for i in range(chunks)])
+    return results
+
+def bench_spawn():
+    results = {}
+    sim = new_world()
+    for count in ENEMY_COUNTS:
+        chunk_platforms = [pygame.Rect(i * 300, 400, 200, game.PLATFORM_HEIGHT) for i in range(count)]
+
+        def spawn():
+            sim.enemy_store.clear()
+            for enemy in game.spawn_enemies(1, chunk_platforms, np.random.default_rng(count), 0):
+                sim.enemy_store.add(enemy)
+        results[f"spawn.platforms={count}"] = measure(spawn)
+
+        # Enemies fall off the random platforms and get culled, so every call
+        # starts from the same population and the restore cost is taken back out.
+        fill_enemies(sim, count)
+        snapshot = snapshot_enemies(sim)
+        restore = measure(lambda: restore_enemies(sim, snapshot))
+
+        def update():
+            restore_enemies(sim, snapshot)
+            game.update_enemies(sim)
+        total = measure(update)
+        results[f"update_enemies.enemies={count}"] = {
+            "median_ms": round(max(total["median_ms"] - restore["median_ms"], 0), 5),
+            "min_ms": round(max(total["min_ms"] - restore["min_ms"], 0), 5),
+            "loops": total["loops"],
+            "restore_ms": restore["min_ms"],
+        }
+    return results
+
+def bench_collision():
+    results = {}
+    sim = new_world()
+    query_rng = np.random.default_rng(3)
+    queries = [pygame.Rect(int(x), int(y), game.PLAYER_WIDTH, game.PLAYER_HEIGHT)
+               for x, y in zip(query_rng.uniform(0, game.SCREEN_WIDTH, 100), query_rng.uniform(0, game.SCREEN_HEIGHT, 100))]
+    results["collision.platform_queries=100"] = measure(
+        lambda: [sim.platform_index.query_rect(q, sim.camera_x_offset) for q in queries])
+
+    for count in ENEMY_COUNTS:
+        fill_enemies(sim, count)
+        results[f"collision.player_enemies={count}"] = measure(
+            lambda: sim.enemy_store.overlapping(200, 300, 200 + game.PLAYER_WIDTH, 300 + game.PLAYER_HEIGHT))
+    fill_enemies(sim, 64)
+    for count in LASER_COUNTS:
+        fill_lasers(sim, count)
+        results[f"collision.lasers={count}x64"] = measure(lambda: sim.laser_pool.enemy_hits(sim.enemy_store))
+    return results
+
+def bench_tone():
+    results = {}
+    for duration in TONE_DURATIONS_MS:
+        results[f"synthesize_wave.ms={duration}"] = measure(
+            lambda: game.synthesize_wave(440.0, duration, 0.1, 'sine', 'pluck'))
+    if not game.ensure_mixer():
+        return results
+
+    # Time the mixer itself on this thread. Posting to the audio worker only
+    # measures a queue put and leaves a backlog that slows the next group.
+    game.audio_worker.stop()
+    game.sfx_mixer.build(game.SFX_SPECS)
+    clock = itertools.count(step=1000)
+    for name in SFX_NAMES:
+        results[f"sfx_mixer.play.{name}"] = measure(lambda: game.sfx_mixer.play(name, next(clock)))
+    pygame.mixer.stop()
+    return results
+
+def bench_text():
+    results = {}
+    surface = pygame.Surface((game.SCREEN_WIDTH, game.SCREEN_HEIGHT))
+    for lines in TEXT_LINES:
+        texts = [f"Benchmark line {i}: score {i * 10}" for i in range(lines)]
+
+        def draw():
+            for i, text in enumerate(texts):
+                game.draw_text(surface, text, 20, 10, (i * 20) % game.SCREEN_HEIGHT)
+        results[f"draw_text.cached.lines={lines}"] = measure(draw)
+
+        def draw_uncached():
+            game._text_cache.clear()
+            draw()
+        results[f"draw_text.uncached.lines={lines}"] = measure(draw_uncached)
+    return results
+
+BENCHMARKS = {
+    'generation': bench_generation,
+    'spawn': bench_spawn,
+    'collision': bench_collision,
+    'tone': bench_tone,
+    'text': bench_text,
+}
+
+
+def compare(results, baseline, threshold):
+    regressions = []
+    for name, result in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        ratio = result["min_ms"] / max(previous["min_ms"], 1e-9)
+        result["baseline_min_ms"] = previous["min_ms"]
+        result["ratio"] = round(ratio, 3)
+        if ratio > 1 + threshold:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmarks for the game's hot paths.")
+    parser.add_argument("--only", nargs="+", choices=sorted(BENCHMARKS), help="run only these groups")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="baseline JSON to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the new baseline")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="allowed slowdown of the best time before a result counts as a regression")
+    args = parser.parse_args()
+
+    game.init_display()
+    game.ensure_mixer()
+    game.update_colors_from_theme()
+
+    results = {}
+    with contextlib.redirect_stdout(sys.stderr):
+        for group in args.only or BENCHMARKS:
+            print(f"Running {group}...")
+            results.update(BENCHMARKS[group]())
+
+    regressions = []
+    if not args.save_baseline and os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f)["results"], args.threshold)
+
+    report = {
+        "python": platform.python_version(),
+        "pygame": pygame.version.ver,
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "threshold": args.threshold,
+        "results": results,
+        "regressions": regressions,
+    }
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Saved baseline to {args.baseline}", file=sys.stderr)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+    for name in regressions:
+        result = results[name]
+        print(f"REGRESSION {name}: {result['min_ms']} ms vs {result['baseline_min_ms']} ms "
+              f"(x{result['ratio']})", file=sys.stderr)
+    game.audio_worker.stop()
+    pygame.quit()
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
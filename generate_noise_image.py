@@ -1,13 +1,32 @@
+import time
+STARTUP_TIME = time.perf_counter()
+
 import pygame
+import os
+import sys
+import json
+import struct
+import hashlib
+import datetime
+import threading
+import queue
+import argparse
 import random
 import math
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
-from perlin_noise import PerlinNoise
+
+from procedural_noise import fbm
 
 
 SCREEN_WIDTH = 1000
 SCREEN_HEIGHT = 700
 FPS = 60
+SIM_DT = 1.0 / FPS
+MAX_FRAME_TIME = 0.25
+MAX_RENDER_FPS = 240
 
 DEATH_BONUS = 50
 
@@ -86,6 +105,7 @@ LASER_HEIGHT = 5
 LASER_SPEED_MAGNITUDE = 15
 LASER_COLOR = None
 PLAYER_LASER_DAMAGE = 20
+MAX_LASERS = 256
 
 ENEMY_WIDTH = 50
 ENEMY_HEIGHT = 50
@@ -93,6 +113,12 @@ ENEMY_SPEED = 2
 ENEMY_HEALTH_DEFAULT = 50
 ENEMY_CONTACT_DAMAGE = 10
 
+ENEMY_TYPES = ('standard', 'flying', 'rolling', 'jumping')
+ENEMY_STANDARD, ENEMY_FLYING, ENEMY_ROLLING, ENEMY_JUMPING = range(len(ENEMY_TYPES))
+ENEMY_COLOR_KEYS = ("ENEMY_STANDARD", "ENEMY_FLYING", "ENEMY_ROLLING", "ENEMY_JUMPING")
+ROLLING_FRAMES = 6
+ROLLING_FRAME_STEP = math.pi * ENEMY_WIDTH / 12 / ROLLING_FRAMES
+
 PLATFORM_HEIGHT = 20
 PLATFORM_MIN_WIDTH = 80
 PLATFORM_MAX_WIDTH = 200
@@ -116,22 +142,23 @@ DIFFICULTY_TIERS = [
 
 NOISE_SCALE = 100.0
 OCTAVES = 6
-NOISE_X_OFFSET_BASE = 0
-NOISE_Y_OFFSET_BASE = 0
-
-platforms = []
-walls = []
-enemies = []
-lasers = []
-player_pos = [SCREEN_WIDTH // 4, 0]
-player_vel_y = 0
-is_jumping = False
-score = 0
-health = 100
-game_over = False
-camera_x_offset = 0
-perlin_gen = None
-current_map_seed = None
+TERRAIN_NOISE_LAYERS = 1
+
+PLATFORM_MIN_Y = SCREEN_HEIGHT * 0.4
+PLATFORM_MAX_Y = SCREEN_HEIGHT - PLATFORM_HEIGHT - 50
+# How far a standing jump lifts the player; steps between platforms keep
+# some slack below it.
+JUMP_HEIGHT = sum(-JUMP_STRENGTH - GRAVITY * tick for tick in range(1, int(-JUMP_STRENGTH / GRAVITY) + 1))
+MAX_STEP_RISE = int(JUMP_HEIGHT * 0.9)
+CHUNK_ANCHOR_BAND = PLATFORM_MAX_Y_DIFF // 2
+# Chunk anchors are interpolated between noise knots this many chunks apart,
+# so neighbouring anchors never differ by more than a single step can climb.
+ANCHOR_KNOT_CHUNKS = int(math.ceil((PLATFORM_MAX_Y - PLATFORM_MIN_Y + 1) / MAX_STEP_RISE))
+
+CHUNK_WIDTH = SCREEN_WIDTH
+CHUNKS_AHEAD = 2
+CHUNKS_BEHIND = 1
+terrain_strips = {}
 
 MENU = 0
 PLAYING = 1
@@ -140,6 +167,18 @@ TUTORIAL = 3
 GENERATION_INFO = 4
 game_state = MENU
 
+FrameInputs = namedtuple('FrameInputs', 'left right jump regenerate cycle_theme shots')
+NO_INPUT = FrameInputs(False, False, False, False, False, ())
+
+screen = None
+clock = None
+sim_accumulator = 0.0
+frame_clock_ms = 0
+pending_inputs = NO_INPUT
+current_sim = None
+input_recorder = None
+audio_enabled = True
+
 start_button_rect = None
 quit_button_rect = None
 tutorial_button_rect = None
@@ -150,12 +189,46 @@ tutorial_back_button_rect = None
 def clamp(value, min_val, max_val):
     return max(min_val, min(value, max_val))
 
-def check_collision(rect1, rect2):
-    return rect1.colliderect(rect2)
+def lerp(a, b, t):
+    return a + (b - a) * t
+
+FONT_CACHE = {}
+TEXT_CACHE_SIZE = 256
+_text_cache = OrderedDict()
+_static_screens = {}
+game_over_overlay = None
+dirty_rects = []
+full_redraw = True
+last_view_key = None
+menu_hover_rect = None
+MENU_CLICK_FLASH_MS = 100
+menu_click = None
+sprite_atlas = {}
+
+def get_font(size):
+    font = FONT_CACHE.get(size)
+    if font is None:
+        if not pygame.font.get_init():
+            pygame.font.init()
+        font = pygame.font.Font(None, size)
+        FONT_CACHE[size] = font
+    return font
+
+def render_text(text, size, color):
+    key = (text, size, tuple(color))
+    text_surface = _text_cache.get(key)
+    if text_surface is not None:
+        _text_cache.move_to_end(key)
+        return text_surface
+
+    text_surface = get_font(size).render(text, True, color)
+    _text_cache[key] = text_surface
+    if len(_text_cache) > TEXT_CACHE_SIZE:
+        _text_cache.popitem(last=False)
+    return text_surface
 
 def draw_text(surface, text, size, x, y, color=WHITE, anchor='topleft'):
-    font = pygame.font.Font(None, size)
-    text_surface = font.render(text, True, color)
+    text_surface = render_text(text, size, color)
     text_rect = text_surface.get_rect()
     if anchor == 'center':
         text_rect.center = (x, y)
@@ -173,6 +246,9 @@ def update_colors_from_theme():
     LASER_COLOR = COLORS["LASER"]
     PLATFORM_COLOR = COLORS["PLATFORM"]
     WALL_COLOR = COLORS["WALL"]
+    _static_screens.clear()
+    terrain_strips.clear()
+    sprite_atlas.clear()
 
 COLOR_TO_NAME = {
     DEFAULT_BLUE_PLAYER:      "Blue",
@@ -196,178 +272,1159 @@ MUSIC_NOTES_FREQ = {
     'REST': 0
 }
 MUSIC_BEAT_LENGTH = 0.25
+MUSIC_NOTE_LENGTH = 0.8
+MUSIC_BAR_BEATS = 4
+MUSIC_VOLUME = 0.1
+MUSIC_CHANNEL_ID = 0
 music_sequence_freq = []
-music_timer = 0
-current_music_note_idx = 0
-current_sound_obj = None
-
-def generate_random_melody(length_beats=40):
-    global music_sequence_freq, current_music_note_idx
-    notes_freq_list = list(MUSIC_NOTES_FREQ.values())
-    music_sequence_freq = [random.choice(notes_freq_list + [MUSIC_NOTES_FREQ['REST']]*2) for _ in range(length_beats)]
-    current_music_note_idx = 0
-    print(f"Generated a new melody sequence of {length_beats} notes.")
-
-def play_tone(frequency, duration_ms, volume=0.1):
-    if frequency == 0:
-        return None
-
+music_pcm = None
+music_beats_rendered = 0
+music_sound = None
+music_channel = None
+music_wants_melody = False
+music_requests = queue.SimpleQueue()
+
+def draw_melody_sequence(sim, length_beats=40):
+    notes_freq_list = list(MUSIC_NOTES_FREQ.values()) + [MUSIC_NOTES_FREQ['REST']]*2
+    return [notes_freq_list[i] for i in sim.rng_streams['melody'].integers(0, len(notes_freq_list), length_beats)]
+
+def generate_random_melody(sim, length_beats=40):
+    post_audio(install_melody, draw_melody_sequence(sim, length_beats))
+    print(f"Generated a new melody sequence of {length_beats} notes.", file=sys.stderr)
+
+def install_melody(sequence, pcm=None):
+    global music_sequence_freq, music_pcm, music_beats_rendered, music_sound, music_wants_melody
+    music_sequence_freq = sequence
+    music_wants_melody = False
+    if pcm is None:
+        music_pcm = np.zeros((len(sequence) * _samples_per_beat(), 2), dtype=np.int16)
+        music_beats_rendered = 0
+        music_sound = None
+    else:
+        music_pcm = pcm
+        music_beats_rendered = len(sequence)
+        music_sound = pygame.sndarray.make_sound(pcm) if ensure_mixer() else None
+
+def _samples_per_beat():
+    return int(MUSIC_BEAT_LENGTH * _SAMPLE_RATE)
+
+def synthesize_melody_beats(sequence, pcm, first_beat, end_beat):
+    beat_samples = _samples_per_beat()
+    note_ms = int(MUSIC_BEAT_LENGTH * 1000 * MUSIC_NOTE_LENGTH)
+    for beat in range(first_beat, end_beat):
+        freq = sequence[beat]
+        if freq == 0:
+            continue
+        note = synthesize_wave(freq, note_ms, MUSIC_VOLUME)
+        start = beat * beat_samples
+        pcm[start:start + len(note)] = note
+
+def render_melody_beats(count):
+    global music_beats_rendered, music_sound
+    end = min(len(music_sequence_freq), music_beats_rendered + count)
+    synthesize_melody_beats(music_sequence_freq, music_pcm, music_beats_rendered, end)
+    music_beats_rendered = end
+    if music_beats_rendered == len(music_sequence_freq) and ensure_mixer():
+        music_sound = pygame.sndarray.make_sound(music_pcm)
+
+ENVELOPES = {
+    'none': (0, 0),
+    'click': (2, 5),
+    'pluck': (2, 40),
+    'swell': (30, 30),
+}
+_noise_rng = np.random.default_rng()
+
+def ensure_mixer():
+    global audio_enabled
+    if audio_enabled and not pygame.mixer.get_init():
+        try:
+            # Synthesized buffers are 16-bit stereo at _SAMPLE_RATE; have SDL
+            # convert instead of handing back a different format.
+            pygame.mixer.init(_SAMPLE_RATE, -16, 2, allowedchanges=0)
+        except pygame.error:
+            audio_enabled = False
+            return False
+        # Music and every SFX voice get a channel of their own; nothing is
+        # left for Sound.play to grab.
+        pygame.mixer.set_num_channels(MUSIC_CHANNEL_ID + 1 + SFX_VOICES)
+        pygame.mixer.set_reserved(MUSIC_CHANNEL_ID + 1 + SFX_VOICES)
+        audio_worker.start()
+    return audio_enabled
+
+
+# Synthesis and every mixer call after init happen on this thread, in the
+# order they were posted, so the frame only pays for a queue put.
+class AudioWorker:
+    def __init__(self):
+        self.requests = queue.SimpleQueue()
+        self.thread = None
+        self.reported = set()
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, name='audio', daemon=True)
+            self.thread.start()
+
+    def post(self, fn, *args):
+        # Nothing would ever drain the queue once the thread is gone.
+        if self.thread is not None and self.thread.is_alive():
+            self.requests.put((fn, args))
+
+    def run(self):
+        while True:
+            request = self.requests.get()
+            if request is None:
+                return
+            fn, args = request
+            try:
+                fn(*args)
+            except Exception as error:
+                # Report each kind of failure once; a broken sound would
+                # otherwise log on every frame it is played.
+                key = (fn.__qualname__, type(error))
+                if key not in self.reported:
+                    self.reported.add(key)
+                    print(f"Audio request {fn.__qualname__} failed: {error!r}", file=sys.stderr)
+
+    def stop(self):
+        if self.thread is not None:
+            self.requests.put(None)
+            self.thread.join()
+            self.thread = None
+
+
+audio_worker = AudioWorker()
+
+def post_audio(fn, *args):
+    if ensure_mixer():
+        audio_worker.post(fn, *args)
+
+def synthesize_wave(frequency, duration_ms, volume=0.1, waveform='sine', envelope='none'):
     num_samples = int(duration_ms * _SAMPLE_RATE / 1000)
-    arr = np.zeros((num_samples, 2), dtype=np.int16)
-
-    amplitude = 32767 * volume
-    for i in range(num_samples):
-        sample_val = int(amplitude * math.sin(2 * math.pi * frequency * i / _SAMPLE_RATE))
-        arr[i, 0] = sample_val
-        arr[i, 1] = sample_val
-    
-    sound = pygame.sndarray.make_sound(arr)
-    sound.play(loops=0)
-    return sound
+    phase = frequency * np.arange(num_samples) / _SAMPLE_RATE
+
+    if waveform == 'sine':
+        wave = np.sin(2 * np.pi * phase)
+    elif waveform == 'square':
+        wave = np.where(phase % 1.0 < 0.5, 1.0, -1.0)
+    elif waveform == 'triangle':
+        wave = 4.0 * np.abs(phase % 1.0 - 0.5) - 1.0
+    elif waveform == 'noise':
+        wave = _noise_rng.uniform(-1.0, 1.0, num_samples)
+    else:
+        raise ValueError(f"Unknown waveform: {waveform}")
+
+    attack_ms, release_ms = ENVELOPES[envelope]
+    attack = min(num_samples, int(attack_ms * _SAMPLE_RATE / 1000))
+    release = min(num_samples - attack, int(release_ms * _SAMPLE_RATE / 1000))
+    if attack:
+        wave[:attack] *= np.linspace(0.0, 1.0, attack, endpoint=False)
+    if release:
+        wave[num_samples - release:] *= np.linspace(1.0, 0.0, release)
+
+    samples = (wave * (32767 * volume)).astype(np.int16)
+    return np.repeat(samples[:, np.newaxis], 2, axis=1)
+
+SfxSpec = namedtuple('SfxSpec', 'note pitch duration_ms volume priority max_voices cooldown_ms waveform envelope')
+
+SFX_VOICES = 6
+SFX_SPECS = {
+    'menu_start':    SfxSpec('C5', 1.0, 100, 0.2, 3, 1, 0, 'sine', 'click'),
+    'menu_tutorial': SfxSpec('E5', 1.0, 100, 0.2, 3, 1, 0, 'sine', 'click'),
+    'menu_info':     SfxSpec('G5', 1.0, 100, 0.2, 3, 1, 0, 'sine', 'click'),
+    'menu_quit':     SfxSpec('C4', 1.0, 150, 0.2, 3, 1, 0, 'sine', 'click'),
+    'menu_back':     SfxSpec('G4', 1.0, 100, 0.2, 3, 1, 0, 'sine', 'click'),
+    'jump':          SfxSpec('C5', 2.0, 70, 0.2, 2, 1, 0, 'triangle', 'pluck'),
+    'wall_jump':     SfxSpec('C5', 1.5, 70, 0.2, 2, 1, 0, 'triangle', 'pluck'),
+    'shoot':         SfxSpec('C4', 2.0, 80, 0.15, 1, 2, 40, 'square', 'pluck'),
+    'hit':           SfxSpec('G4', 1.5, 50, 0.15, 1, 2, 30, 'square', 'click'),
+    'kill':          SfxSpec('G4', 0.5, 100, 0.2, 2, 2, 0, 'noise', 'pluck'),
+    'hurt':          SfxSpec('F4', 0.5, 50, 0.1, 1, 1, 150, 'noise', 'click'),
+    'theme':         SfxSpec('A4', 1.0, 50, 0.1, 1, 1, 0, 'sine', 'click'),
+    'death':         SfxSpec('C4', 1.0, 200, 0.3, 4, 1, 0, 'triangle', 'swell'),
+    'fall':          SfxSpec('C4', 0.5, 200, 0.3, 4, 1, 0, 'triangle', 'swell'),
+}
 
-def handle_music_playback(dt):
-    global music_timer, current_music_note_idx, current_sound_obj
 
-    if not music_sequence_freq:
+class SfxMixer:
+    def __init__(self, voices):
+        self.voices = voices
+        self.channels = []
+        self.names = [None] * voices
+        self.priorities = [0] * voices
+        self.started = [0] * voices
+        self.sounds = {}
+        self.ready_at = {}
+
+    def build(self, specs):
+        if self.sounds:
+            return
+        self.channels = [pygame.mixer.Channel(MUSIC_CHANNEL_ID + 1 + i) for i in range(self.voices)]
+        for name, spec in specs.items():
+            wave = synthesize_wave(MUSIC_NOTES_FREQ[spec.note] * spec.pitch, spec.duration_ms, spec.volume,
+                                   spec.waveform, spec.envelope)
+            self.sounds[name] = pygame.sndarray.make_sound(wave)
+
+    def pick_voice(self, name, spec):
+        busy = [channel.get_busy() for channel in self.channels]
+        same = [i for i in range(self.voices) if busy[i] and self.names[i] == name]
+        if len(same) >= spec.max_voices:
+            return min(same, key=self.started.__getitem__)
+        if not all(busy):
+            return busy.index(False)
+
+        # Steal the least important voice, oldest first, but never one that
+        # matters more than the new sound.
+        victim = min(range(self.voices), key=lambda i: (self.priorities[i], self.started[i]))
+        return victim if self.priorities[victim] <= spec.priority else None
+
+    def play(self, name, now):
+        self.build(SFX_SPECS)
+        spec = SFX_SPECS[name]
+        if now < self.ready_at.get(name, 0):
+            return None
+        voice = self.pick_voice(name, spec)
+        if voice is None:
+            return None
+        self.channels[voice].play(self.sounds[name])
+        self.names[voice] = name
+        self.priorities[voice] = spec.priority
+        self.started[voice] = now
+        self.ready_at[name] = now + spec.cooldown_ms
+        return voice
+
+
+sfx_mixer = SfxMixer(SFX_VOICES)
+
+def build_sfx_bank():
+    post_audio(sfx_mixer.build, SFX_SPECS)
+
+def play_sfx(name):
+    # Cooldowns run on the time the sound was asked for, not when the audio
+    # thread gets to it.
+    profile_audio(post_audio, sfx_mixer.play, name, time.perf_counter() * 1000)
+
+def get_music_channel():
+    global music_channel
+    if music_channel is None:
+        music_channel = pygame.mixer.Channel(MUSIC_CHANNEL_ID)
+    return music_channel
+
+def handle_music_playback(sim):
+    # The audio thread only asks for the next melody; drawing it touches the
+    # melody RNG stream, which belongs to the game thread.
+    try:
+        music_requests.get_nowait()
+    except queue.Empty:
+        pass
+    else:
+        generate_random_melody(sim)
+    post_audio(service_music)
+
+def service_music():
+    # music_wants_melody is only touched on this thread; it stays set until
+    # the requested melody is installed, so queued calls can't ask twice.
+    global music_wants_melody
+    if not music_sequence_freq or music_wants_melody:
         return
 
-    music_timer += dt
+    if music_sound is None:
+        render_melody_beats(MUSIC_BAR_BEATS)
+        return
 
-    if music_timer >= MUSIC_BEAT_LENGTH * 1000:
-        music_timer = 0
+    channel = get_music_channel()
+    if not channel.get_busy():
+        channel.play(music_sound)
+    elif channel.get_queue() is None:
+        channel.queue(music_sound)
+    else:
+        return
+    music_wants_melody = True
+    music_requests.put(True)
 
-        if current_sound_obj:
-            current_sound_obj.stop()
+def restart_music():
+    post_audio(stop_music_channel)
 
-        freq = music_sequence_freq[current_music_note_idx]
-        current_sound_obj = play_tone(freq, int(MUSIC_BEAT_LENGTH * 1000 * 0.8))
+def start_map_music(sequence, pcm=None):
+    post_audio(install_melody, sequence, pcm)
+    if pcm is None:
+        post_audio(render_melody_beats, len(sequence))
+    restart_music()
 
-        current_music_note_idx += 1
-        if current_music_note_idx >= len(music_sequence_freq):
-            current_music_note_idx = 0
-            generate_random_melody()
+def stop_music_channel():
+    get_music_channel().stop()
 
 
 def stop_all_music():
-    pygame.mixer.stop()
+    if audio_enabled and pygame.mixer.get_init():
+        audio_worker.post(pygame.mixer.stop)
+
+
+def play_sim_audio(sim):
+    # The simulation only records what should be heard; this is where it is
+    # posted to the audio thread.
+    sounds, music_events = sim.take_audio()
+    for fn, args in music_events:
+        profile_audio(fn, *args)
+    for name in sounds:
+        play_sfx(name)
+
+
+def sample_terrain_noise(world_xs, world):
+    noise_x = (np.asarray(world_xs) + world.noise_x_offset) / (NOISE_SCALE * 2)
+    noise_y = world.noise_y_offset / (NOISE_SCALE * 2)
+    return fbm(noise_x, noise_y, world.seed, frequency=OCTAVES, layers=TERRAIN_NOISE_LAYERS)
+
+
+class LevelIndex:
+    def __init__(self, rects):
+        self.rects = sorted(rects, key=lambda r: r.left)
+        self.lefts = [r.left for r in self.rects]
+        self.max_width = max((r.width for r in self.rects), default=0)
+        self.left_array = np.array(self.lefts, dtype=np.float64)
+        self.right_array = np.array([r.right for r in self.rects], dtype=np.float64)
+        self.top_array = np.array([r.top for r in self.rects], dtype=np.float64)
+        self.bottom_array = np.array([r.bottom for r in self.rects], dtype=np.float64)
+        self.center_array = (self.left_array + self.right_array) / 2
+
+    def query(self, left, top, right, bottom):
+        start = bisect_left(self.lefts, left - self.max_width + 1)
+        end = bisect_left(self.lefts, right, start)
+        return [r for r in self.rects[start:end] if r.right > left and r.top < bottom and r.bottom > top]
+
+    def query_rect(self, rect, x_offset=0):
+        return self.query(rect.left + x_offset, rect.top, rect.right + x_offset, rect.bottom)
+
+    def nearest(self, x):
+        if not self.rects:
+            return None
+        containing = bisect_right(self.lefts, x) - 1
+        if containing >= 0 and x <= self.right_array[containing]:
+            return self.rects[containing]
+
+        # Rects don't overlap, so their centres are sorted like their lefts.
+        i = int(np.searchsorted(self.center_array, x))
+        if i == len(self.rects) or (i > 0 and x - self.center_array[i - 1] <= self.center_array[i] - x):
+            i -= 1
+        return self.rects[i]
+
+    def support_tops(self, x, y, width, height):
+        tops = np.full(len(x), np.nan)
+        if not self.rects:
+            return tops
+
+        # Rects are non-overlapping, so a box can only rest on the last rect
+        # starting left of its right edge or on the one before it.
+        last = np.searchsorted(self.left_array, x + width) - 1
+        for candidate in (last - 1, last):
+            c = np.clip(candidate, 0, None)
+            top = self.top_array[c]
+            hit = (candidate >= 0) & np.isnan(tops) & \
+                (x < self.right_array[c]) & (x + width > self.left_array[c]) & \
+                (y < self.bottom_array[c]) & (y + height > top)
+            tops[hit] = top[hit]
+        return tops
+
+
+class Enemy:
+    __slots__ = ('chunk', 'x', 'y', 'vx', 'vy', 'health', 'walk_start_x', 'walk_end_x',
+                 'jump_cooldown', 'current_jump_cooldown', 'is_jumping')
+    type = ENEMY_STANDARD
+
+    def __init__(self, chunk, x, y, vx, vy=0, health=ENEMY_HEALTH_DEFAULT,
+                 walk_start_x=0, walk_end_x=0, jump_cooldown=0):
+        self.chunk = chunk
+        self.x = x
+        self.y = y
+        self.vx = vx
+        self.vy = vy
+        self.health = health
+        self.walk_start_x = walk_start_x
+        self.walk_end_x = walk_end_x
+        self.jump_cooldown = jump_cooldown
+        self.current_jump_cooldown = jump_cooldown
+        self.is_jumping = False
+
+    def place(self, rng, platform, chunk_start, speed_mult):
+        self.vx = 0
+
+
+class FlyingEnemy(Enemy):
+    __slots__ = ()
+    type = ENEMY_FLYING
+
+    def place(self, rng, platform, chunk_start, speed_mult):
+        self.y = int(rng.integers(SCREEN_HEIGHT // 4, SCREEN_HEIGHT // 2, endpoint=True))
+        self.vx = ENEMY_SPEED * 1.5 * speed_mult
+        self.walk_start_x = chunk_start
+        self.walk_end_x = chunk_start + CHUNK_WIDTH
+
+
+class RollingEnemy(Enemy):
+    __slots__ = ()
+    type = ENEMY_ROLLING
+
+    def place(self, rng, platform, chunk_start, speed_mult):
+        self.walk_start_x = platform.x
+        self.walk_end_x = platform.x + platform.width - ENEMY_WIDTH
+
+
+class JumpingEnemy(Enemy):
+    __slots__ = ()
+    type = ENEMY_JUMPING
+
+    def place(self, rng, platform, chunk_start, speed_mult):
+        self.jump_cooldown = self.current_jump_cooldown = int(rng.integers(90, 180, endpoint=True))
+
+
+# Indexed by the ENEMY_TYPES codes.
+ENEMY_CLASSES = (Enemy, FlyingEnemy, RollingEnemy, JumpingEnemy)
+
+
+class EnemyStore:
+    FIELDS = (
+        ('x', np.float64), ('y', np.float64), ('vx', np.float64), ('vy', np.float64),
+        ('health', np.float64), ('type', np.int8), ('chunk', np.int64),
+        ('walk_start_x', np.float64), ('walk_end_x', np.float64),
+        ('jump_cooldown', np.int32), ('current_jump_cooldown', np.int32), ('is_jumping', np.bool_),
+        ('prev_x', np.float64), ('prev_y', np.float64),
+    )
+
+    def __init__(self, capacity=64):
+        self.count = 0
+        self.capacity = capacity
+        for name, dtype in self.FIELDS:
+            setattr(self, name, np.zeros(capacity, dtype=dtype))
+
+    def _grow(self):
+        self.capacity *= 2
+        for name, dtype in self.FIELDS:
+            grown = np.zeros(self.capacity, dtype=dtype)
+            grown[:self.count] = getattr(self, name)[:self.count]
+            setattr(self, name, grown)
+
+    SPAWN_FIELDS = ('type',) + Enemy.__slots__
+
+    def add(self, spawn):
+        if self.count == self.capacity:
+            self._grow()
+        slot = self.count
+        for name in self.SPAWN_FIELDS:
+            getattr(self, name)[slot] = getattr(spawn, name)
+        self.prev_x[slot] = self.x[slot]
+        self.prev_y[slot] = self.y[slot]
+        self.count += 1
+        return slot
+
+    def remove(self, slot):
+        last = self.count - 1
+        if slot != last:
+            for name, _ in self.FIELDS:
+                column = getattr(self, name)
+                column[slot] = column[last]
+        self.count = last
+
+    def remove_slots(self, slots):
+        for slot in sorted(set(int(s) for s in slots), reverse=True):
+            self.remove(slot)
+
+    def clear(self):
+        self.count = 0
+
+    def snapshot(self):
+        n = self.count
+        self.prev_x[:n] = self.x[:n]
+        self.prev_y[:n] = self.y[:n]
+
+    def overlapping(self, left, top, right, bottom):
+        n = self.count
+        x = self.x[:n]
+        y = self.y[:n]
+        return np.flatnonzero((x < right) & (x + ENEMY_WIDTH > left) & (y < bottom) & (y + ENEMY_HEIGHT > top))
+
+    def rect(self, slot, x_offset=0, alpha=1.0):
+        x = lerp(self.prev_x[slot], self.x[slot], alpha)
+        y = lerp(self.prev_y[slot], self.y[slot], alpha)
+        return pygame.Rect(x - x_offset, y, ENEMY_WIDTH, ENEMY_HEIGHT)
+
+
+class LaserPool:
+    def __init__(self, capacity=MAX_LASERS):
+        self.capacity = capacity
+        self.count = 0
+        self.x = np.zeros(capacity)
+        self.y = np.zeros(capacity)
+        self.vx = np.zeros(capacity)
+        self.vy = np.zeros(capacity)
+        self.prev_x = np.zeros(capacity)
+        self.prev_y = np.zeros(capacity)
+
+    def fire(self, x, y, vx, vy):
+        if self.count == self.capacity:
+            return False
+        slot = self.count
+        self.x[slot] = x
+        self.y[slot] = y
+        self.vx[slot] = vx
+        self.vy[slot] = vy
+        self.prev_x[slot] = x
+        self.prev_y[slot] = y
+        self.count += 1
+        return True
+
+    def remove_slots(self, slots):
+        for slot in sorted(set(int(s) for s in slots), reverse=True):
+            last = self.count - 1
+            for column in (self.x, self.y, self.vx, self.vy, self.prev_x, self.prev_y):
+                column[slot] = column[last]
+            self.count = last
+
+    def clear(self):
+        self.count = 0
+
+    def snapshot(self):
+        n = self.count
+        self.prev_x[:n] = self.x[:n]
+        self.prev_y[:n] = self.y[:n]
+
+    def advance(self):
+        n = self.count
+        self.x[:n] += self.vx[:n]
+        self.y[:n] += self.vy[:n]
+        x = self.x[:n]
+        y = self.y[:n]
+        self.remove_slots(np.flatnonzero((x > SCREEN_WIDTH) | (x < 0) | (y > SCREEN_HEIGHT) | (y < 0)))
+
+    def enemy_hits(self, enemies, x_offset=0):
+        n = self.count
+        m = enemies.count
+        if n == 0 or m == 0:
+            return np.zeros((n, m), dtype=bool)
+        lx = self.x[:n, np.newaxis]
+        ly = self.y[:n, np.newaxis]
+        ex = enemies.x[np.newaxis, :m] - x_offset
+        ey = enemies.y[np.newaxis, :m]
+        return (lx < ex + ENEMY_WIDTH) & (lx + LASER_WIDTH > ex) & (ly < ey + ENEMY_HEIGHT) & (ly + LASER_HEIGHT > ey)
+
+
+RNG_STREAMS = ('maps', 'melody', 'bot')
+
+
+# Everything one simulation reads and writes. step() advances it without
+# touching module state, so several can run side by side in one process;
+# the frame loop renders it and plays the audio it asked for.
+class SimState:
+    def __init__(self, seed=None, map_seed=None):
+        self.session_seed = random.randrange(2 ** 31) if seed is None else seed
+        self.rng_streams = {name: np.random.default_rng([self.session_seed, stream_id])
+                            for stream_id, name in enumerate(RNG_STREAMS)}
+        # map_seed replaces the session's first map; later maps still come
+        # from the 'maps' stream.
+        self.upcoming_map_seeds = [] if map_seed is None else [map_seed]
+
+        self.current_map_seed = None
+        self.map_params = None
+        self.world_chunks = {}
+        self.chunk_tiers = {}
+        self.loaded_chunk_range = None
+        self.platforms = []
+        self.walls = []
+        self.platform_index = None
+        self.wall_index = None
+        self.enemy_store = EnemyStore()
+        self.laser_pool = LaserPool()
+        self.level_cache = LevelCache()
+        self.prefetcher = None
+        self.prefetched_chunks = {}
+
+        self.player_pos = [SCREEN_WIDTH // 4, 0]
+        self.prev_player_pos = list(self.player_pos)
+        self.player_vel_y = 0
+        self.is_jumping = False
+        self.score = 0
+        self.health = 100
+        self.game_over = False
+        self.camera_x_offset = 0
+        self.prev_camera_x_offset = 0
+        self.theme_index = 0
+
+        self.sounds = []
+        self.music_events = []
+
+    def take_audio(self):
+        sounds, music_events = self.sounds, self.music_events
+        self.sounds, self.music_events = [], []
+        return sounds, music_events
+
+
+def peek_map_seed(sim):
+    if not sim.upcoming_map_seeds:
+        sim.upcoming_map_seeds.append(int(sim.rng_streams['maps'].integers(0, 1000001)))
+    return sim.upcoming_map_seeds[0]
+
+def next_map_seed(sim):
+    if sim.upcoming_map_seeds:
+        return sim.upcoming_map_seeds.pop(0)
+    return int(sim.rng_streams['maps'].integers(0, 1000001))
+
+
+WorldParams = namedtuple('WorldParams', 'seed noise_x_offset noise_y_offset tier')
+
+def make_world_params(seed, tier):
+    offset_rng = np.random.default_rng(seed)
+    return WorldParams(seed, offset_rng.uniform(0, 1000), offset_rng.uniform(0, 1000), tier)
+
+def current_world_params(sim, tier=None):
+    if tier is None:
+        tier = get_current_difficulty_tier_index(sim)
+    return sim.map_params._replace(tier=tier)
+
+
+def chunk_rng(chunk_index, seed):
+    return np.random.default_rng([seed, chunk_index])
+
+
+def anchor_knot_y(knot, world):
+    if knot == 0:
+        return SCREEN_HEIGHT - 100
+    noise_val = float(sample_terrain_noise(knot * ANCHOR_KNOT_CHUNKS * CHUNK_WIDTH, world))
+    anchor_y = PLATFORM_MIN_Y + (PLATFORM_MAX_Y - PLATFORM_MIN_Y) * (noise_val + 0.5)
+    return clamp(anchor_y, PLATFORM_MIN_Y, PLATFORM_MAX_Y)
+
+
+def chunk_anchor_y(chunk_index, world):
+    knot, offset = divmod(chunk_index, ANCHOR_KNOT_CHUNKS)
+    return int(lerp(anchor_knot_y(knot, world), anchor_knot_y(knot + 1, world), offset / ANCHOR_KNOT_CHUNKS))
+
+
+def generate_chunk(chunk_index, world):
+    rng = chunk_rng(chunk_index, world.seed)
+    chunk_start = chunk_index * CHUNK_WIDTH
+    chunk_end = chunk_start + CHUNK_WIDTH
+
+    chunk_platforms = []
+    chunk_walls = []
+
+    last_platform_right = chunk_start
+    if chunk_index == 0:
+        chunk_platforms.append(pygame.Rect(0, SCREEN_HEIGHT - 100, SCREEN_WIDTH / 2, PLATFORM_HEIGHT))
+        last_platform_right = chunk_platforms[0].right
+
+    current_difficulty = DIFFICULTY_TIERS[world.tier]
+    platform_y_diff_mult = current_difficulty["platform_gap_mult"]
+    min_gap = int(PLATFORM_MIN_GAP * platform_y_diff_mult)
+    max_gap = int(PLATFORM_MAX_GAP * platform_y_diff_mult)
+
+    max_count = (chunk_end - last_platform_right) // (min_gap + PLATFORM_MIN_WIDTH) + 1
+    gaps = rng.integers(min_gap, max_gap, max_count, endpoint=True)
+    widths = rng.integers(PLATFORM_MIN_WIDTH, PLATFORM_MAX_WIDTH, max_count, endpoint=True)
+
+    # Every chunk ends with a platform flush against its right edge, so the
+    # gap into the next chunk is that chunk's own first gap.
+    previous_rights = []
+    lefts = []
+    rights = []
+    for gap, width in zip(gaps, widths):
+        left = min(last_platform_right + int(gap), chunk_end - PLATFORM_MIN_WIDTH)
+        right = left + int(width)
+        if right + min_gap + PLATFORM_MIN_WIDTH > chunk_end:
+            right = chunk_end
+        previous_rights.append(last_platform_right)
+        lefts.append(left)
+        rights.append(right)
+        last_platform_right = right
+        if right == chunk_end:
+            break
+    count = len(lefts)
+
+    noise_vals_y = sample_terrain_noise(previous_rights, world)
+    y_diffs = (noise_vals_y * PLATFORM_MAX_Y_DIFF * 2 * platform_y_diff_mult).astype(int) - PLATFORM_MAX_Y_DIFF
+
+    has_wall = rng.random(count) < 0.3
+    wall_heights = rng.integers(WALL_MIN_HEIGHT, WALL_MAX_HEIGHT, count, endpoint=True)
+    wall_on_left = rng.random(count) < 0.5
+    wall_above = rng.random(count) < 0.7
+
+    last_platform_y = chunk_anchor_y(chunk_index, world)
+    next_anchor_y = chunk_anchor_y(chunk_index + 1, world)
+
+    # No step rises more than MAX_STEP_RISE, the walk always stays within
+    # reach of the band around the next anchor, and the chunk ends in that
+    # band. The previous chunk ended at most CHUNK_ANCHOR_BAND below this
+    # chunk's anchor, so the first step leaves room for that.
+    for i in range(count):
+        max_rise = MAX_STEP_RISE - CHUNK_ANCHOR_BAND if i == 0 else MAX_STEP_RISE
+        next_platform_y = max(last_platform_y + y_diffs[i], last_platform_y - max_rise)
+        next_platform_y = min(next_platform_y, next_anchor_y + CHUNK_ANCHOR_BAND + (count - 1 - i) * MAX_STEP_RISE)
+        if i == count - 1:
+            next_platform_y = clamp(next_platform_y, next_anchor_y - CHUNK_ANCHOR_BAND, next_anchor_y + CHUNK_ANCHOR_BAND)
+        next_platform_y = int(clamp(next_platform_y, PLATFORM_MIN_Y, PLATFORM_MAX_Y))
+        new_platform = pygame.Rect(lefts[i], next_platform_y, rights[i] - lefts[i], PLATFORM_HEIGHT)
+        chunk_platforms.append(new_platform)
+
+        if has_wall[i]:
+            wall_height = int(wall_heights[i])
+            wall_x = new_platform.left if wall_on_left[i] else new_platform.right - WALL_WIDTH
+            
+            wall_y = new_platform.top - wall_height if wall_above[i] else new_platform.top
+            
+            wall_y = clamp(wall_y, 0, new_platform.top - WALL_WIDTH)
+            
+            chunk_walls.append(pygame.Rect(wall_x, wall_y, WALL_WIDTH, wall_height))
 
+        last_platform_y = new_platform.y
 
-def generate_platforms_and_walls():
-    global platforms, walls, NOISE_X_OFFSET_BASE, NOISE_Y_OFFSET_BASE, perlin_gen, current_map_seed
+    chunk_enemies = spawn_enemies(chunk_index, chunk_platforms, rng, world.tier)
+    return chunk_platforms, chunk_walls, chunk_enemies
+
+
+LEVEL_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'procedural-jump-run', 'levels')
+LEVEL_CACHE_MAX_BYTES = 8 * 1024 * 1024
+LEVEL_FORMAT_VERSION = 3
+LEVEL_PLATFORM, LEVEL_WALL, LEVEL_ENEMY = range(3)
+LEVEL_RECORD_DTYPE = np.dtype([
+    ('chunk', np.int32), ('tier', np.int8), ('kind', np.int8),
+    ('x', np.float64), ('y', np.float64), ('width', np.float64), ('height', np.float64),
+    ('type', np.int8), ('vx', np.float64), ('vy', np.float64), ('health', np.float64),
+    ('walk_start_x', np.float64), ('walk_end_x', np.float64), ('jump_cooldown', np.int32),
+])
+level_cache_enabled = False
+
+def level_cache_file(seed):
+    params = (LEVEL_FORMAT_VERSION, NOISE_SCALE, OCTAVES, TERRAIN_NOISE_LAYERS, CHUNK_WIDTH)
+    digest = hashlib.sha1(repr(params).encode()).hexdigest()[:12]
+    return os.path.join(LEVEL_CACHE_DIR, f"{seed}-{digest}.npy")
+
+def encode_chunk(chunk_index, tier, chunk_platforms, chunk_walls, chunk_enemies):
+    rows = [(chunk_index, tier, LEVEL_PLATFORM, p.x, p.y, p.width, p.height, 0, 0, 0, 0, 0, 0, 0) for p in chunk_platforms]
+    rows += [(chunk_index, tier, LEVEL_WALL, w.x, w.y, w.width, w.height, 0, 0, 0, 0, 0, 0, 0) for w in chunk_walls]
+    rows += [(chunk_index, tier, LEVEL_ENEMY, e.x, e.y, ENEMY_WIDTH, ENEMY_HEIGHT, e.type, e.vx, e.vy, e.health,
+              e.walk_start_x, e.walk_end_x, e.jump_cooldown) for e in chunk_enemies]
+    return np.array(rows, dtype=LEVEL_RECORD_DTYPE)
+
+def decode_chunk(records):
+    chunk_platforms = []
+    chunk_walls = []
+    chunk_enemies = []
+    for (chunk_index, tier, kind, x, y, width, height, enemy_type, vx, vy, health,
+         walk_start_x, walk_end_x, jump_cooldown) in records.tolist():
+        if kind == LEVEL_PLATFORM:
+            chunk_platforms.append(pygame.Rect(x, y, width, height))
+        elif kind == LEVEL_WALL:
+            chunk_walls.append(pygame.Rect(x, y, width, height))
+        else:
+            chunk_enemies.append(ENEMY_CLASSES[enemy_type](chunk_index, x, y, vx, vy, health,
+                                                           walk_start_x, walk_end_x, jump_cooldown))
+    return chunk_platforms, chunk_walls, chunk_enemies
+
+def index_level_records(records):
+    if not len(records):
+        return {}
+    chunks = np.asarray(records['chunk'])
+    tiers = np.asarray(records['tier'])
+    starts = np.flatnonzero(np.r_[True, (np.diff(chunks) != 0) | (np.diff(tiers) != 0)])
+    ends = np.r_[starts[1:], len(records)]
+    return {(int(chunks[s]), int(tiers[s])): (int(s), int(e)) for s, e in zip(starts, ends)}
+
+class LevelCache:
+    def __init__(self):
+        self.path = None
+        self.records = None
+        self.index = {}
+        self.pending = {}
+
+    def open(self, seed):
+        self.flush()
+        self.path = self.records = None
+        self.index = {}
+        if not level_cache_enabled:
+            return
+
+        self.path = level_cache_file(seed)
+        try:
+            self.records = np.load(self.path, mmap_mode='r')
+            self.index = index_level_records(self.records)
+            os.utime(self.path)
+        except (OSError, ValueError):
+            self.records = None
+            self.index = {}
+
+    def get(self, chunk_index, tier):
+        span = self.index.get((chunk_index, tier))
+        if span is not None:
+            return decode_chunk(self.records[span[0]:span[1]])
+        # A chunk unloaded and loaded again before the next flush must not be
+        # written twice, or its records would be merged into one doubled chunk.
+        records = self.pending.get((chunk_index, tier))
+        if records is not None:
+            return decode_chunk(records)
+        return None
 
-    platforms = []
-    walls = []
-    
-    if current_map_seed is None:
-        current_map_seed = random.randint(0, 1000000)
-    
-    perlin_gen = PerlinNoise(octaves=OCTAVES, seed=current_map_seed)
+    def put(self, chunk_index, tier, records):
+        self.pending[(chunk_index, tier)] = records
+
+    def flush(self):
+        if self.path is None or not self.pending or not level_cache_enabled:
+            self.pending = {}
+            return
+
+        parts = ([np.array(self.records)] if self.records is not None else []) + list(self.pending.values())
+        records = np.concatenate(parts)
+        records = records[np.lexsort((records['tier'], records['chunk']))]
+        self.records = None
+        self.pending = {}
+
+        try:
+            os.makedirs(LEVEL_CACHE_DIR, exist_ok=True)
+            temp_path = self.path + '.tmp'
+            with open(temp_path, 'wb') as f:
+                np.save(f, records)
+            os.replace(temp_path, self.path)
+        except OSError as error:
+            self.disable(error)
+            return
+        self.evict()
+
+    def evict(self):
+        try:
+            names = [name for name in os.listdir(LEVEL_CACHE_DIR) if name.endswith('.npy')]
+        except OSError as error:
+            self.disable(error)
+            return
+
+        # Another instance may evict or rewrite files at the same time; a file
+        # that can't be looked at or removed is just skipped.
+        entries = []
+        for name in names:
+            try:
+                stat = os.stat(os.path.join(LEVEL_CACHE_DIR, name))
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= LEVEL_CACHE_MAX_BYTES:
+                break
+            path = os.path.join(LEVEL_CACHE_DIR, name)
+            if path == self.path:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError:
+                continue
+            total -= size
+
+    def disable(self, error):
+        # The game plays the same without the cache; chunks are just generated
+        # every time.
+        global level_cache_enabled
+        print(f"Level cache disabled: {error}", file=sys.stderr)
+        level_cache_enabled = False
+        self.path = self.records = None
+        self.index = {}
+        self.pending = {}
+
+
+def load_chunk(sim, chunk_index):
+    # A chunk keeps the tier it was first generated at, so walking back to it
+    # after the score has moved on brings back the same layout.
+    tier = sim.chunk_tiers.setdefault(chunk_index, get_current_difficulty_tier_index(sim))
+    world = current_world_params(sim, tier)
+    prefetched = sim.prefetched_chunks.pop((sim.current_map_seed, chunk_index, tier), None)
+    cache = sim.level_cache
+    if cache.path is None:
+        return prefetched or generate_chunk(chunk_index, world)
+
+    chunk = cache.get(chunk_index, tier)
+    if chunk is None:
+        chunk = prefetched or generate_chunk(chunk_index, world)
+        cache.put(chunk_index, tier, encode_chunk(chunk_index, tier, *chunk))
+    return chunk
+
+
+def generate_chunk_records(chunk_index, world):
+    return encode_chunk(chunk_index, world.tier, *generate_chunk(chunk_index, world))
+
+def generate_level_records(world, chunk_indices, workers=1):
+    # Chunks only depend on their own seed and the terrain noise, so they can
+    # be generated in any order and on any process.
+    chunk_indices = list(chunk_indices)
+    if workers <= 1 or len(chunk_indices) < 2:
+        return [generate_chunk_records(chunk_index, world) for chunk_index in chunk_indices]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(generate_chunk_records, chunk_indices, [world] * len(chunk_indices),
+                                 chunksize=max(1, len(chunk_indices) // (workers * 4))))
+
+def pregenerate_level(seed, chunk_count, tier, workers):
+    cache = LevelCache()
+    cache.open(seed)
+    missing = [i for i in range(chunk_count) if (i, tier) not in cache.index]
+    records = generate_level_records(make_world_params(seed, tier), missing, workers)
+    for chunk_index, chunk_records in zip(missing, records):
+        cache.put(chunk_index, tier, chunk_records)
+    cache.flush()
+    return len(missing)
+
+
+def chunk_range_at(camera_x):
+    first_chunk = max(0, int(camera_x) // CHUNK_WIDTH - CHUNKS_BEHIND)
+    last_chunk = int(camera_x + SCREEN_WIDTH) // CHUNK_WIDTH + CHUNKS_AHEAD
+    return first_chunk, last_chunk
+
+def update_world_chunks(sim):
+    first_chunk, last_chunk = chunk_range_at(sim.camera_x_offset)
+    if sim.loaded_chunk_range == (first_chunk, last_chunk):
+        return
 
-    NOISE_X_OFFSET_BASE = random.uniform(0, 1000)
-    NOISE_Y_OFFSET_BASE = random.uniform(0, 1000)
+    world_chunks = sim.world_chunks
+    for chunk_index in list(world_chunks):
+        if chunk_index < first_chunk or chunk_index > last_chunk:
+            del world_chunks[chunk_index]
+    enemy_store = sim.enemy_store
+    chunk_ids = enemy_store.chunk[:enemy_store.count]
+    enemy_store.remove_slots(np.flatnonzero((chunk_ids < first_chunk) | (chunk_ids > last_chunk)))
+
+    for chunk_index in range(first_chunk, last_chunk + 1):
+        if chunk_index not in world_chunks:
+            chunk_platforms, chunk_walls, chunk_enemies = load_chunk(sim, chunk_index)
+            world_chunks[chunk_index] = (chunk_platforms, chunk_walls)
+            for spawn in chunk_enemies:
+                enemy_store.add(spawn)
+
+    sim.platforms = [p for chunk_index in range(first_chunk, last_chunk + 1) for p in world_chunks[chunk_index][0]]
+    sim.walls = [w for chunk_index in range(first_chunk, last_chunk + 1) for w in world_chunks[chunk_index][1]]
+    sim.platform_index = LevelIndex(sim.platforms)
+    sim.wall_index = LevelIndex(sim.walls)
+    sim.loaded_chunk_range = (first_chunk, last_chunk)
+    request_prefetch_chunks(sim)
+
+
+class WorldPrefetcher:
+    def __init__(self):
+        self.jobs = queue.Queue()
+        self.lock = threading.Lock()
+        self.seed = None
+        self.wanted = ()
+        self.chunks = {}
+        self.melody = None
+        self.thread = None
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, name='world-prefetch', daemon=True)
+            self.thread.start()
+
+    def prepare(self, seed, melody_sequence):
+        with self.lock:
+            self.seed = seed
+            self.wanted = ()
+            self.chunks = {}
+            self.melody = None
+        self.jobs.put((seed, melody_sequence))
+
+    def request(self, chunk_indices, tier):
+        # Only the window the next world will be loaded at is kept; chunks the
+        # player has moved away from are dropped rather than piling up.
+        with self.lock:
+            wanted = tuple((self.seed, chunk_index, tier) for chunk_index in chunk_indices)
+            if self.seed is None or wanted == self.wanted:
+                return
+            self.wanted = wanted
+            self.chunks = {key: chunk for key, chunk in self.chunks.items() if key in self.wanted}
+            seed = self.seed
+        self.jobs.put((seed, None))
+
+    def next_missing_chunk(self):
+        with self.lock:
+            return next((key for key in self.wanted if key not in self.chunks), None)
+
+    def run(self):
+        while True:
+            seed, melody_sequence = self.jobs.get()
+            if seed != self.seed:
+                continue
 
+            if melody_sequence is not None:
+                pcm = np.zeros((len(melody_sequence) * _samples_per_beat(), 2), dtype=np.int16)
+                synthesize_melody_beats(melody_sequence, pcm, 0, len(melody_sequence))
+                with self.lock:
+                    if seed == self.seed:
+                        self.melody = (melody_sequence, pcm)
+                continue
 
-    platforms.append(pygame.Rect(0, SCREEN_HEIGHT - 100, SCREEN_WIDTH / 2, PLATFORM_HEIGHT))
-    
-    last_platform_right = platforms[0].right
-    last_platform_y = platforms[0].y
+            key = self.next_missing_chunk()
+            while key is not None:
+                seed, chunk_index, tier = key
+                chunk = generate_chunk(chunk_index, make_world_params(seed, tier))
+                with self.lock:
+                    if key in self.wanted:
+                        self.chunks[key] = chunk
+                key = self.next_missing_chunk()
+
+    def take(self, seed):
+        with self.lock:
+            if seed != self.seed:
+                return {}, None
+            chunks, melody = self.chunks, self.melody
+            self.seed = None
+            self.wanted = ()
+            self.chunks = {}
+            self.melody = None
+        return chunks, melody
+
+
+world_prefetcher = WorldPrefetcher()
+
+def schedule_prefetch(sim):
+    if sim.prefetcher is not None:
+        sim.prefetcher.start()
+        sim.prefetcher.prepare(peek_map_seed(sim), draw_melody_sequence(sim))
+        request_prefetch_chunks(sim)
+
+def request_prefetch_chunks(sim):
+    if sim.prefetcher is not None:
+        # Prefetch exactly the window regenerate_world_in_place loads, which
+        # is the one around the camera; before the first world is built this
+        # warms the chunks reset_game starts with.
+        first_chunk, last_chunk = sim.loaded_chunk_range or chunk_range_at(0)
+        sim.prefetcher.request(range(first_chunk, last_chunk + 1), get_current_difficulty_tier_index(sim))
+
+def take_prefetched_world(sim, seed):
+    if sim.prefetcher is None:
+        return None
+    sim.prefetched_chunks, melody = sim.prefetcher.take(seed)
+    return melody
 
-    generation_end_x = SCREEN_WIDTH * 5
 
-    while last_platform_right < generation_end_x:
-        noise_val_y = perlin_gen([(last_platform_right + NOISE_X_OFFSET_BASE) / (NOISE_SCALE * 2), (NOISE_Y_OFFSET_BASE) / (NOISE_SCALE * 2)])
-        
-        current_difficulty = get_current_difficulty_tier()
-        platform_y_diff_mult = current_difficulty["platform_gap_mult"]
+def build_terrain_strip(world_chunks, chunk_index):
+    chunk_start = chunk_index * CHUNK_WIDTH
+    strip = pygame.Surface((CHUNK_WIDTH, SCREEN_HEIGHT))
+    strip.fill(COLORS["SKY"])
 
-        y_diff = int(noise_val_y * PLATFORM_MAX_Y_DIFF * 2 * platform_y_diff_mult) - PLATFORM_MAX_Y_DIFF
+    # Accent lines can spill a pixel or two past a chunk edge, so neighbouring
+    # chunks are drawn too and clipped by the strip.
+    for neighbour in (chunk_index - 1, chunk_index, chunk_index + 1):
+        if neighbour not in world_chunks:
+            continue
+        chunk_platforms, chunk_walls = world_chunks[neighbour]
+        for p in chunk_platforms:
+            pygame.draw.rect(strip, COLORS["PLATFORM"], p.move(-chunk_start, 0))
+            pygame.draw.line(strip, COLORS["DARK_ACCENT"], (p.left - chunk_start, p.top), (p.right - chunk_start, p.top), 3)
 
-        next_platform_y = last_platform_y + y_diff
-        
-        min_allowed_y = SCREEN_HEIGHT * 0.4
-        max_allowed_y = SCREEN_HEIGHT - PLATFORM_HEIGHT - 50
-        next_platform_y = clamp(next_platform_y, min_allowed_y, max_allowed_y)
+        for w in chunk_walls:
+            pygame.draw.rect(strip, COLORS["WALL"], w.move(-chunk_start, 0))
+            pygame.draw.line(strip, COLORS["DARK_ACCENT"], (w.left - chunk_start, w.top), (w.left - chunk_start, w.bottom), 3)
+            pygame.draw.line(strip, COLORS["DARK_ACCENT"], (w.right - chunk_start, w.top), (w.right - chunk_start, w.bottom), 3)
+    return strip
 
-        gap = random.randint(int(PLATFORM_MIN_GAP * platform_y_diff_mult), int(PLATFORM_MAX_GAP * platform_y_diff_mult))
-        platform_width = random.randint(PLATFORM_MIN_WIDTH, PLATFORM_MAX_WIDTH)
 
-        next_platform_x = last_platform_right + gap
-        
-        new_platform = pygame.Rect(next_platform_x, next_platform_y, platform_width, PLATFORM_HEIGHT)
-        platforms.append(new_platform)
+def draw_terrain(surface, world_chunks, view_x):
+    # Strips remember the chunk they were drawn from; a chunk that was
+    # unloaded, reloaded or belongs to a new map gets a fresh one.
+    for chunk_index in [i for i, (chunk, _) in terrain_strips.items() if world_chunks.get(i) is not chunk]:
+        del terrain_strips[chunk_index]
 
-        if random.random() < 0.3:
-            wall_height = random.randint(WALL_MIN_HEIGHT, WALL_MAX_HEIGHT)
-            wall_x = new_platform.left if random.random() < 0.5 else new_platform.right - WALL_WIDTH
-            
-            wall_y = new_platform.top - wall_height if random.random() < 0.7 else new_platform.top
-            
-            wall_y = clamp(wall_y, 0, new_platform.top - WALL_WIDTH)
-            
-            walls.append(pygame.Rect(wall_x, wall_y, WALL_WIDTH, wall_height))
+    first_visible = int(view_x) // CHUNK_WIDTH
+    last_visible = int(view_x + SCREEN_WIDTH - 1) // CHUNK_WIDTH
+    for chunk_index in range(first_visible, last_visible + 1):
+        cached = terrain_strips.get(chunk_index)
+        if cached is None:
+            cached = (world_chunks.get(chunk_index), build_terrain_strip(world_chunks, chunk_index))
+            terrain_strips[chunk_index] = cached
+        surface.blit(cached[1], (chunk_index * CHUNK_WIDTH - int(view_x), 0))
 
 
-        last_platform_right = new_platform.right
-        last_platform_y = new_platform.y
-    
-    print(f"Generated {len(platforms)} platforms and {len(walls)} walls.")
+def generate_platforms_and_walls(sim):
+    if sim.current_map_seed is None:
+        sim.current_map_seed = next_map_seed(sim)
 
+    sim.map_params = make_world_params(sim.current_map_seed, 0)
+    sim.level_cache.open(sim.current_map_seed)
 
-def spawn_enemies():
-    global enemies
-    enemies = []
+    sim.world_chunks.clear()
+    sim.chunk_tiers.clear()
+    sim.enemy_store.clear()
+    sim.loaded_chunk_range = None
+    update_world_chunks(sim)
 
-    enemy_types = ['standard', 'flying', 'rolling', 'jumping']
+    print(f"Generated {len(sim.world_chunks)} chunks with {len(sim.platforms)} platforms, {len(sim.walls)} walls and {sim.enemy_store.count} enemies.", file=sys.stderr)
 
-    current_difficulty = get_current_difficulty_tier()
+
+def spawn_enemies(chunk_index, chunk_platforms, rng, tier):
+    chunk_enemies = []
+
+    current_difficulty = DIFFICULTY_TIERS[tier]
     enemy_speed_mult = current_difficulty["enemy_speed_mult"]
     enemy_spawn_chance = current_difficulty["enemy_spawn_chance"]
 
-    for i in range(1, len(platforms)):
-        if random.random() < enemy_spawn_chance:
-            platform = platforms[i]
+    chunk_start = chunk_index * CHUNK_WIDTH
+    first_platform = 1 if chunk_index == 0 else 0
+
+    for i in range(first_platform, len(chunk_platforms)):
+        if rng.random() < enemy_spawn_chance:
+            platform = chunk_platforms[i]
             if platform.width < ENEMY_WIDTH:
                 continue
 
-            enemy_type = random.choice(enemy_types)
-            enemy_x = platform.x + random.randint(0, platform.width - ENEMY_WIDTH)
-            enemy_y = platform.y - ENEMY_HEIGHT
-            
-            new_enemy = {
-                'id': f"e_{i}_{random.randint(0,999)}",
-                'type': enemy_type,
-                'rect': pygame.Rect(enemy_x, enemy_y, ENEMY_WIDTH, ENEMY_HEIGHT),
-                'vx': ENEMY_SPEED * (1 if random.random() > 0.5 else -1) * enemy_speed_mult,
-                'vy': 0,
-                'health': ENEMY_HEALTH_DEFAULT,
-                'color': RED,
-            }
-
-            if enemy_type == 'standard':
-                new_enemy['color'] = COLORS["ENEMY_STANDARD"]
-                new_enemy['vx'] = 0
-            elif enemy_type == 'flying':
-                new_enemy['rect'].y = random.randint(SCREEN_HEIGHT // 4, SCREEN_HEIGHT // 2)
-                new_enemy['vx'] = ENEMY_SPEED * 1.5 * enemy_speed_mult
-                new_enemy['color'] = COLORS["ENEMY_FLYING"]
-            elif enemy_type == 'rolling':
-                new_enemy['color'] = COLORS["ENEMY_ROLLING"]
-                new_enemy['walk_start_x'] = platform.x
-                new_enemy['walk_end_x'] = platform.x + platform.width - ENEMY_WIDTH
-            elif enemy_type == 'jumping':
-                new_enemy['color'] = COLORS["ENEMY_JUMPING"]
-                new_enemy['jump_cooldown'] = random.randint(90, 180)
-                new_enemy['current_jump_cooldown'] = new_enemy['jump_cooldown']
-                new_enemy['is_jumping'] = False
-
-            enemies.append(new_enemy)
-    print(f"Spawned {len(enemies)} enemies.")
-
-def get_current_difficulty_tier():
+            enemy_class = ENEMY_CLASSES[int(rng.integers(len(ENEMY_TYPES)))]
+            enemy_x = platform.x + int(rng.integers(0, platform.width - ENEMY_WIDTH, endpoint=True))
+            enemy_vx = ENEMY_SPEED * (1 if rng.random() > 0.5 else -1) * enemy_speed_mult
+            new_enemy = enemy_class(chunk_index, enemy_x, platform.y - ENEMY_HEIGHT, enemy_vx)
+            new_enemy.place(rng, platform, chunk_start, enemy_speed_mult)
+            chunk_enemies.append(new_enemy)
+    return chunk_enemies
+
+
+def update_enemies(sim):
+    enemy_store = sim.enemy_store
+    n = enemy_store.count
+    if n == 0:
+        return
+    types = enemy_store.type[:n]
+    x = enemy_store.x[:n]
+    y = enemy_store.y[:n]
+    vx = enemy_store.vx[:n]
+    vy = enemy_store.vy[:n]
+    walk_start_x = enemy_store.walk_start_x[:n]
+    walk_end_x = enemy_store.walk_end_x[:n]
+
+    flying = types == ENEMY_FLYING
+    x[flying] += vx[flying]
+    vx[flying & ((x <= walk_start_x) | (x + ENEMY_WIDTH >= walk_end_x))] *= -1
+
+    grounded_types = ~flying
+    vy[grounded_types] += GRAVITY
+    y[grounded_types] += vy[grounded_types]
+
+    tops = sim.platform_index.support_tops(x, y, ENEMY_WIDTH, ENEMY_HEIGHT)
+    on_platform = grounded_types & (vy >= 0) & ~np.isnan(tops)
+    y[on_platform] = tops[on_platform] - ENEMY_HEIGHT
+    vy[on_platform] = 0
+
+    rolling = on_platform & (types == ENEMY_ROLLING)
+    x[rolling] += vx[rolling]
+    vx[rolling & ((x < walk_start_x) | (x + ENEMY_WIDTH > walk_end_x))] *= -1
+
+    jumping = on_platform & (types == ENEMY_JUMPING)
+    cooldown = enemy_store.current_jump_cooldown[:n]
+    is_jumping = enemy_store.is_jumping[:n]
+    is_jumping[jumping] = False
+    cooldown[jumping] -= 1
+    launch = jumping & (cooldown <= 0)
+    vy[launch] = JUMP_STRENGTH * 0.8
+    is_jumping[launch] = True
+    cooldown[launch] = enemy_store.jump_cooldown[:n][launch]
+
+    enemy_store.remove_slots(np.flatnonzero(grounded_types & ~on_platform & (y > SCREEN_HEIGHT + 50)))
+
+def get_current_difficulty_tier_index(sim):
     for i in range(len(DIFFICULTY_TIERS) - 1, -1, -1):
-        if score >= DIFFICULTY_TIERS[i]["score"]:
-            return DIFFICULTY_TIERS[i]
-    return DIFFICULTY_TIERS[0]
+        if sim.score >= DIFFICULTY_TIERS[i]["score"]:
+            return i
+    return 0
 
 def draw_player(surface, rect, color):
     pygame.draw.rect(surface, color, rect)
@@ -428,10 +1485,11 @@ def draw_enemy_flying(surface, rect, color):
     pygame.draw.circle(surface, BLACK, (rect.centerx - rect.width*0.2, rect.centery - rect.height*0.1), int(rect.width*0.08))
     pygame.draw.circle(surface, BLACK, (rect.centerx + rect.width*0.2, rect.centery - rect.height*0.1), int(rect.width*0.08))
 
-def draw_enemy_rolling(surface, rect, color):
+def draw_enemy_rolling(surface, rect, color, frame=0):
     pygame.draw.circle(surface, color, rect.center, rect.width // 2)
+    spin = frame * (2 * math.pi / 12) / ROLLING_FRAMES
     for i in range(12):
-        angle = i * (2 * math.pi / 12)
+        angle = i * (2 * math.pi / 12) + spin
         x1 = rect.centerx + (rect.width // 2) * math.cos(angle)
         y1 = rect.centery + (rect.width // 2) * math.sin(angle)
         x2 = rect.centerx + (rect.width // 2 + 10) * math.cos(angle)
@@ -457,528 +1515,1012 @@ def draw_enemy_jumping(surface, rect, color):
     pygame.draw.circle(surface, WHITE, (rect.centerx + int(rect.width * 0.08), rect.centery - int(rect.height * 0.08)), int(rect.width * 0.08))
 
 
-def game_loop():
-    global player_pos, player_vel_y, is_jumping, score, health, game_over, camera_x_offset, current_map_seed, lasers, enemies, game_state, clock
-    global start_button_rect, quit_button_rect, tutorial_button_rect, game_info_button_rect, tutorial_back_button_rect
-    global current_theme_index
-    
-    dt = clock.get_time()
+def build_tutorial_screen():
+    surface = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
+    surface.fill(BLACK)
+    draw_text(surface, "--- HOW TO PLAY ---", 60, SCREEN_WIDTH // 2, 50, COLORS["MENU_TEXT"], anchor='center')
+
+    tutorial_text = [
+        "Your goal is to survive as long as possible and get a high score!",
+        "",
+        "CONTROLS:",
+        f"- Move Left:  <-- Arrow Key or 'A'",
+        f"- Move Right: --> Arrow Key or 'D'",
+        f"- Jump:       ^ Arrow Key or 'W' or SPACEBAR",
+        f"- Shoot Laser: LEFT MOUSE CLICK (aim with mouse cursor)",
+        f"- New Map:    Press 'R' (regenerate world around you, score persists!)",
+        f"- Change Colors: Press 'C' (cycle through visual themes)",
+        f"- Back/Quit:  Press 'ESC' (from any menu/info screen)",
+        "",
+        "ABILITIES:",
+        f"- Wall Run: While jumping, move against a {COLOR_TO_NAME[COLORS['WALL']]} wall to slide slowly.",
+        f"- Wall Jump: While wall running, press Jump again to leap off the wall!",
+        "",
+        "ENEMIES:",
+        f"- Player (You): A {COLOR_TO_NAME[COLORS['PLAYER']]} figure.",
+        f"- Standard Enemies: {COLOR_TO_NAME[COLORS['ENEMY_STANDARD']]} simple blocks (stationary, but fall with gravity).",
+        f"- Rolling Enemies:  {COLOR_TO_NAME[COLORS['ENEMY_ROLLING']]} spiky circles (patrol platforms).",
+        f"- Jumping Enemies:  {COLOR_TO_NAME[COLORS['ENEMY_JUMPING']]} bouncy blobs (periodically leap).",
+        f"- Flying Enemies:   {COLOR_TO_NAME[COLORS['ENEMY_FLYING']]} ellipses with wings (move horizontally in air).",
+        "  Beware! Contact with enemies damages your health!",
+        "",
+        "GAME FLOW:",
+        "Each map is randomly generated using advanced noise algorithms. ",
+        "Platforms, walls, and enemy placements are unique every time you press 'R'.",
+        "Your score and health persist when you regenerate the world in place!",
+        "",
+        "The 'art' of this game comes from the procedurally generated shapes and colors!",
+    ]
 
-    on_ground = False
+    text_y = 120
+    for line in tutorial_text:
+        draw_text(surface, line, 25, SCREEN_WIDTH // 2, text_y, COLORS["MENU_TEXT"], anchor='center')
+        text_y += 30
+
+    back_button_rect = draw_text(surface, "BACK TO MENU", 40, SCREEN_WIDTH // 2, SCREEN_HEIGHT - 60, COLORS["MENU_START_BTN"], anchor='center')
+    return surface, (back_button_rect,)
+
+def build_generation_info_screen():
+    surface = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
+    surface.fill(BLACK)
+    draw_text(surface, "--- GAME GENERATION DETAILS ---", 60, SCREEN_WIDTH // 2, 50, COLORS["MENU_TEXT"], anchor='center')
+
+    info_text = [
+        f"Current Map Seed: {current_sim.current_map_seed}",
+        f"Noise Scale (Roughness): {NOISE_SCALE}",
+        f"Noise Octaves (Detail): {OCTAVES}",
+        "",
+        "Procedural Art (Colors & Shapes - Cycle with 'C'):",
+        f"- Player Color: {COLOR_TO_NAME[COLORS['PLAYER']]}",
+        f"- Platform Color: {COLOR_TO_NAME[COLORS['PLATFORM']]}",
+        f"- Wall Color: {COLOR_TO_NAME[COLORS['WALL']]}",
+        f"- Laser Color: {COLOR_TO_NAME[COLORS['LASER']]}",
+        "",
+        "Enemy Types (Colors & Behavior):",
+        f"- Standard Enemy: {COLOR_TO_NAME[COLORS['ENEMY_STANDARD']]}",
+        f"- Flying Enemy:   {COLOR_TO_NAME[COLORS['ENEMY_FLYING']]}",
+        f"- Rolling Enemy:  {COLOR_TO_NAME[COLORS['ENEMY_ROLLING']]}",
+        f"- Jumping Enemy:  {COLOR_TO_NAME[COLORS['ENEMY_JUMPING']]}",
+        "",
+        "Procedural Music:",
+        "  A simple, randomized chiptune-like melody plays during the game.",
+        "  Each new map (generated with 'R') will generate a unique sequence of notes!",
+        "",
+        "NOTE ON CUSTOMIZATION (Image/Music):",
+        "This game is designed to run purely locally on your computer with Pygame.",
+        "It does NOT use external AI services for image or complex music generation",
+        "to ensure it remains completely free and does NOT require internet access or",
+        "API keys, preventing any potential costs for you."
+    ]
+
+    text_y = 120
+    for line in info_text:
+        draw_text(surface, line, 25, SCREEN_WIDTH // 2, text_y, COLORS["MENU_TEXT"], anchor='center')
+        text_y += 30
+
+    back_button_rect = draw_text(surface, "BACK TO MENU", 40, SCREEN_WIDTH // 2, SCREEN_HEIGHT - 60, COLORS["MENU_START_BTN"], anchor='center')
+    return surface, (back_button_rect,)
+
+def build_menu_screen():
+    surface = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
+    surface.fill(COLORS["MENU_BG"])
+    draw_text(surface, "Procedural Jump & Run", 60, SCREEN_WIDTH // 2, SCREEN_HEIGHT // 4, COLORS["MENU_TEXT"], anchor='center')
+
+    buttons = (
+        draw_text(surface, "START GAME", 50, SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 - 40, COLORS["MENU_START_BTN"], anchor='center'),
+        draw_text(surface, "HOW TO PLAY", 50, SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 + 40, COLORS["MENU_TUTORIAL_BTN"], anchor='center'),
+        draw_text(surface, "GAME DETAILS", 50, SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 + 120, COLORS["MENU_INFO_BTN"], anchor='center'),
+        draw_text(surface, "QUIT", 50, SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 + 200, COLORS["MENU_QUIT_BTN"], anchor='center'),
+    )
+    return surface, buttons
+
+STATIC_SCREEN_BUILDERS = {
+    MENU: build_menu_screen,
+    TUTORIAL: build_tutorial_screen,
+    GENERATION_INFO: build_generation_info_screen,
+}
+
+def get_static_screen(state):
+    cached = _static_screens.get(state)
+    if cached is None or cached[0] != current_sim.current_map_seed:
+        cached = (current_sim.current_map_seed,) + STATIC_SCREEN_BUILDERS[state]()
+        _static_screens[state] = cached
+    return cached[1], cached[2]
+
+def get_game_over_overlay():
+    global game_over_overlay
+    if game_over_overlay is None:
+        game_over_overlay = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
+        game_over_overlay.fill((0, 0, 0, 180))
+    return game_over_overlay
+
+def mark_dirty(rect):
+    dirty_rects.append(rect)
+
+def request_full_redraw():
+    global full_redraw
+    full_redraw = True
+
+def present():
+    global full_redraw
+    if full_redraw:
+        pygame.display.flip()
+        full_redraw = False
+    elif dirty_rects:
+        pygame.display.update(dirty_rects)
+    dirty_rects.clear()
+
+
+PROFILE_PHASES = ('events', 'world', 'physics', 'enemies', 'lasers', 'terrain', 'entities', 'hud', 'audio', 'overlay', 'present', 'wait')
+(PHASE_EVENTS, PHASE_WORLD, PHASE_PHYSICS, PHASE_ENEMIES, PHASE_LASERS, PHASE_TERRAIN, PHASE_ENTITIES,
+ PHASE_HUD, PHASE_AUDIO, PHASE_OVERLAY, PHASE_PRESENT, PHASE_WAIT) = range(len(PROFILE_PHASES))
+PROFILE_FRAMES = 600
+PROFILE_OVERLAY_INTERVAL = 15
+PROFILE_BAR_MS = 1000 / FPS
+PROFILE_CSV_PATH = 'frame_profile.csv'
+profiler_enabled = False
+profile_samples = np.zeros((PROFILE_FRAMES, len(PROFILE_PHASES)))
+profile_frames_recorded = 0
+profile_current = np.zeros(len(PROFILE_PHASES))
+profile_recording = False
+profile_last = 0.0
+profile_nested = 0.0
+profile_overlay = None
+
+def toggle_profiler():
+    global profiler_enabled, profile_overlay, profile_recording, profile_last, profile_nested
+    profiler_enabled = not profiler_enabled
+    # Toggling mid-frame would leave a partial row, or one that spans the
+    # time the profiler was off; recording restarts with the next frame.
+    profile_recording = False
+    profile_last = time.perf_counter()
+    profile_nested = 0.0
+    profile_overlay = None
+    request_full_redraw()
+
+def profile_begin_frame():
+    global profile_frames_recorded, profile_recording, profile_last, profile_nested
+    # A frame only reaches the stats once it has been timed from start to end.
+    if profile_recording:
+        profile_frames_recorded += 1
+        profile_samples[profile_frames_recorded % PROFILE_FRAMES] = profile_current
+    profile_current[:] = 0
+    profile_recording = profiler_enabled
+    profile_last = time.perf_counter()
+    profile_nested = 0.0
+
+def profile_lap(phase):
+    global profile_last, profile_nested
+    if profile_recording:
+        now = time.perf_counter()
+        profile_current[phase] += now - profile_last - profile_nested
+        profile_last = now
+        profile_nested = 0.0
+
+def profile_nested_time(phase, seconds):
+    global profile_nested
+    if profile_recording:
+        profile_current[phase] += seconds
+        profile_nested += seconds
+
+def profile_audio(fn, *args):
+    # Audio work is charged to PHASE_AUDIO rather than whichever phase it was
+    # posted from.
+    if not profiler_enabled:
+        return fn(*args)
+    start = time.perf_counter()
+    result = fn(*args)
+    profile_nested_time(PHASE_AUDIO, time.perf_counter() - start)
+    return result
+
+def profile_history():
+    count = min(profile_frames_recorded, PROFILE_FRAMES)
+    newest = profile_frames_recorded % PROFILE_FRAMES
+    order = [(newest - count + 1 + i) % PROFILE_FRAMES for i in range(count)]
+    return profile_samples[order] * 1000
+
+def build_profiler_overlay():
+    history = profile_history()
+    if not len(history):
+        return None
+    work = history[:, :PHASE_WAIT].sum(axis=1)
+    phase_mean = history.mean(axis=0)
+    phase_p99 = np.percentile(history, 99, axis=0)
+
+    font = get_font(18)
+    line_height = 18
+    bar_left = 190
+    bar_width = 120
+    panel = pygame.Surface((bar_left + bar_width + 10, line_height * (len(PROFILE_PHASES) + 2) + 10))
+    panel.fill(BLACK)
+    header = f"frame {work.mean():.2f} ms, p99 {np.percentile(work, 99):.2f} ms ({len(history)} frames)"
+    panel.blit(font.render(header, True, WHITE), (5, 5))
+
+    rows = [("phase", "mean", "p99")] + [(name, f"{phase_mean[phase]:.2f}", f"{phase_p99[phase]:.2f}")
+                                         for phase, name in enumerate(PROFILE_PHASES)]
+    for row, (name, mean_text, p99_text) in enumerate(rows):
+        y = 5 + line_height * (row + 1)
+        panel.blit(font.render(name, True, WHITE), (5, y))
+        for text, right in ((mean_text, 125), (p99_text, 175)):
+            text_surface = font.render(text, True, WHITE)
+            panel.blit(text_surface, text_surface.get_rect(topright=(right, y)))
+        if row == 0:
+            continue
+        phase = row - 1
+        bar = int(bar_width * min(1.0, phase_mean[phase] / PROFILE_BAR_MS))
+        p99_x = bar_left + int(bar_width * min(1.0, phase_p99[phase] / PROFILE_BAR_MS))
+        pygame.draw.rect(panel, (0, 200, 0), (bar_left, y + 3, max(1, bar), line_height - 6))
+        pygame.draw.line(panel, RED, (p99_x, y + 2), (p99_x, y + line_height - 4), 2)
+    return panel
+
+def draw_profiler_overlay(surface):
+    global profile_overlay
+    if profile_overlay is None or profile_frames_recorded % PROFILE_OVERLAY_INTERVAL == 0:
+        profile_overlay = build_profiler_overlay()
+    if profile_overlay is not None:
+        mark_dirty(surface.blit(profile_overlay, (SCREEN_WIDTH - profile_overlay.get_width() - 10, 10)))
+
+def dump_profile_csv(path=PROFILE_CSV_PATH):
+    history = profile_history()
+    if not len(history):
+        return
+    with open(path, 'w') as f:
+        f.write("frame," + ",".join(f"{name}_ms" for name in PROFILE_PHASES) + "\n")
+        first_frame = profile_frames_recorded - len(history) + 1
+        for i, row in enumerate(history):
+            f.write(f"{first_frame + i}," + ",".join(f"{value:.4f}" for value in row) + "\n")
+    print(f"Wrote {len(history)} profiled frames to {path}", file=sys.stderr)
+
+
+ENEMY_DRAWERS = (draw_enemy_standard, draw_enemy_flying, draw_enemy_rolling, draw_enemy_jumping)
+
+SPRITE_PADDING = {
+    draw_player: (8, 24),
+    draw_enemy_standard: (0, 0),
+    draw_enemy_flying: (42, 2),
+    draw_enemy_rolling: (12, 12),
+    draw_enemy_jumping: (2, 6),
+}
+
+
+def get_sprite(drawer, width, height, color, frame=0):
+    key = (drawer, width, height, tuple(color), frame)
+    sprite = sprite_atlas.get(key)
+    if sprite is None:
+        pad_x, pad_y = SPRITE_PADDING[drawer]
+        sprite = pygame.Surface((width + 2 * pad_x, height + 2 * pad_y), pygame.SRCALPHA)
+        body = pygame.Rect(pad_x, pad_y, width, height)
+        if drawer is draw_enemy_rolling:
+            drawer(sprite, body, color, frame)
+        else:
+            drawer(sprite, body, color)
+        sprite_atlas[key] = sprite
+    return sprite
+
+
+def blit_sprite(surface, drawer, rect, color, frame=0):
+    pad_x, pad_y = SPRITE_PADDING[drawer]
+    surface.blit(get_sprite(drawer, rect.width, rect.height, color, frame), (rect.x - pad_x, rect.y - pad_y))
+
+
+def click_menu_button(rect, target_state):
+    global menu_click
+    menu_click = (rect, target_state, frame_clock_ms + MENU_CLICK_FLASH_MS)
+
+def poll_inputs():
+    global game_state, menu_click
+
+    jump = regenerate = cycle_theme = False
+    shots = []
+
+    # The flash is drawn by render_frame; the click takes effect once it's over.
+    if menu_click is not None and frame_clock_ms >= menu_click[2]:
+        target_state = menu_click[1]
+        menu_click = None
+        if target_state is None:
+            return None
+        if target_state == PLAYING:
+            start_game()
+        else:
+            game_state = target_state
 
     for event in pygame.event.get():
         if event.type == pygame.QUIT:
-            stop_all_music()
-            return False
+            return None
+
+        if event.type == pygame.WINDOWEXPOSED:
+            request_full_redraw()
 
         if event.type == pygame.KEYDOWN:
+            if event.key == pygame.K_F3:
+                toggle_profiler()
+
             if game_state == PLAYING:
-                keys_pressed_current_frame = pygame.key.get_pressed()
-                player_rect = pygame.Rect(player_pos[0], player_pos[1], PLAYER_WIDTH, PLAYER_HEIGHT)
-
-                wall_left_contact = False
-                wall_right_contact = False
-                all_vertical_surfaces = []
-                for p in platforms:
-                    adjusted_p_rect = p.move(-camera_x_offset, 0)
-                    if adjusted_p_rect.height > PLAYER_HEIGHT:
-                        all_vertical_surfaces.append(adjusted_p_rect)
-                for w in walls:
-                    all_vertical_surfaces.append(w.move(-camera_x_offset, 0))
-
-                for obj_rect in all_vertical_surfaces:
-                    player_left_detector = pygame.Rect(player_rect.left - 2, player_rect.top + 5, 4, PLAYER_HEIGHT - 10)
-                    player_right_detector = pygame.Rect(player_rect.right - 2, player_rect.top + 5, 4, PLAYER_HEIGHT - 10)
-
-                    if player_left_detector.colliderect(obj_rect):
-                        wall_left_contact = True
-                    if player_right_detector.colliderect(obj_rect):
-                        wall_right_contact = True
-                
-                if (event.key == pygame.K_SPACE or event.key == pygame.K_UP) and not on_ground:
-                    if wall_left_contact and (keys_pressed_current_frame[pygame.K_RIGHT] or keys_pressed_current_frame[pygame.K_d]):
-                        player_vel_y = WALL_JUMP_VERTICAL_PUSH
-                        player_pos[0] += WALL_JUMP_HORIZONTAL_PUSH
-                        is_jumping = True
-                        play_tone(MUSIC_NOTES_FREQ['C5'] * 1.5, 70, 0.2)
-                    elif wall_right_contact and (keys_pressed_current_frame[pygame.K_LEFT] or keys_pressed_current_frame[pygame.K_a]):
-                        player_vel_y = WALL_JUMP_VERTICAL_PUSH
-                        player_pos[0] -= WALL_JUMP_HORIZONTAL_PUSH
-                        is_jumping = True
-                        play_tone(MUSIC_NOTES_FREQ['C5'] * 1.5, 70, 0.2)
-                    elif not is_jumping:
-                        player_vel_y = JUMP_STRENGTH
-                        is_jumping = True
-                        play_tone(MUSIC_NOTES_FREQ['C5'] * 2, 70, 0.2)
-                
+                if event.key == pygame.K_SPACE or event.key == pygame.K_UP:
+                    jump = True
                 if event.key == pygame.K_r:
-                    if player_pos[1] + PLAYER_HEIGHT < SCREEN_HEIGHT:
-                        regenerate_world_in_place()
-                
+                    regenerate = True
                 if event.key == pygame.K_c:
-                    current_theme_index = (current_theme_index + 1) % len(COLOR_THEMES)
-                    update_colors_from_theme()
-                    play_tone(MUSIC_NOTES_FREQ['A4'], 50, 0.1)
+                    cycle_theme = True
 
             if event.key == pygame.K_ESCAPE:
                 if game_state == TUTORIAL or game_state == GENERATION_INFO:
                     game_state = MENU
                 else:
-                    stop_all_music()
-                    return False
+                    return None
             
             if game_state == GAME_OVER_STATE and event.key == pygame.K_r:
-                game_state = PLAYING
-                reset_game()
+                start_game()
 
         if event.type == pygame.MOUSEBUTTONDOWN:
             mouse_x, mouse_y = event.pos
-            if game_state == MENU:
-                target_rect = None
+            if game_state == MENU and menu_click is None:
                 if start_button_rect and start_button_rect.collidepoint(mouse_x, mouse_y):
-                    target_rect = start_button_rect
-                    play_tone(MUSIC_NOTES_FREQ['C5'], 100, 0.2)
-                    pygame.time.wait(50)
-                    game_state = PLAYING
-                    reset_game()
+                    play_sfx('menu_start')
+                    click_menu_button(start_button_rect, PLAYING)
                 elif tutorial_button_rect and tutorial_button_rect.collidepoint(mouse_x, mouse_y):
-                    target_rect = tutorial_button_rect
-                    play_tone(MUSIC_NOTES_FREQ['E5'], 100, 0.2)
-                    pygame.time.wait(50)
-                    game_state = TUTORIAL
+                    play_sfx('menu_tutorial')
+                    click_menu_button(tutorial_button_rect, TUTORIAL)
                 elif game_info_button_rect and game_info_button_rect.collidepoint(mouse_x, mouse_y):
-                    target_rect = game_info_button_rect
-                    play_tone(MUSIC_NOTES_FREQ['G5'], 100, 0.2)
-                    pygame.time.wait(50)
-                    game_state = GENERATION_INFO
+                    play_sfx('menu_info')
+                    click_menu_button(game_info_button_rect, GENERATION_INFO)
                 elif quit_button_rect and quit_button_rect.collidepoint(mouse_x, mouse_y):
-                    target_rect = quit_button_rect
-                    play_tone(MUSIC_NOTES_FREQ['C4'], 150, 0.2)
-                    pygame.time.wait(50)
-                    stop_all_music()
-                    return False
-                
-                if target_rect:
-                    pygame.draw.rect(screen, COLORS["MENU_CLICK_FLASH"], target_rect.inflate(15, 15), 0)
-                    pygame.display.flip()
-                    pygame.time.wait(50)
+                    play_sfx('menu_quit')
+                    click_menu_button(quit_button_rect, None)
             
             elif game_state == PLAYING and event.button == 1:
-                if not game_over:
-                    player_center_x = player_pos[0] + PLAYER_WIDTH // 2
-                    player_center_y = player_pos[1] + PLAYER_HEIGHT // 2
-                    
-                    target_x = mouse_x
-                    target_y = mouse_y
-                    
-                    dx = target_x - player_center_x
-                    dy = target_y - player_center_y
-                    
-                    magnitude = math.sqrt(dx**2 + dy**2)
-                    if magnitude > 0:
-                        norm_dx = dx / magnitude
-                        norm_dy = dy / magnitude
-                    else:
-                        norm_dx = 1
-                        norm_dy = 0
-                        
-                    lasers.append({
-                        'rect': pygame.Rect(player_center_x, player_center_y, LASER_WIDTH, LASER_HEIGHT),
-                        'vx': norm_dx * LASER_SPEED_MAGNITUDE,
-                        'vy': norm_dy * LASER_SPEED_MAGNITUDE
-                    })
-                    play_tone(MUSIC_NOTES_FREQ['C4'] * 2, 80, 0.15)
+                shots.append((mouse_x, mouse_y))
             elif game_state == TUTORIAL:
                 if tutorial_back_button_rect and tutorial_back_button_rect.collidepoint(mouse_x, mouse_y):
-                    play_tone(MUSIC_NOTES_FREQ['G4'], 100, 0.2)
-                    pygame.time.wait(50)
+                    play_sfx('menu_back')
                     game_state = MENU
             elif game_state == GENERATION_INFO:
                 if tutorial_back_button_rect and tutorial_back_button_rect.collidepoint(mouse_x, mouse_y):
-                    play_tone(MUSIC_NOTES_FREQ['G4'], 100, 0.2)
-                    pygame.time.wait(50)
+                    play_sfx('menu_back')
                     game_state = MENU
 
+    keys = pygame.key.get_pressed()
+    return FrameInputs(keys[pygame.K_LEFT] or keys[pygame.K_a], keys[pygame.K_RIGHT] or keys[pygame.K_d],
+                       jump, regenerate, cycle_theme, tuple(shots))
+
+
+def player_jump(sim, inputs):
+    player_pos = sim.player_pos
+    player_rect = pygame.Rect(player_pos[0], player_pos[1], PLAYER_WIDTH, PLAYER_HEIGHT)
+
+    player_left_detector = pygame.Rect(player_rect.left - 2, player_rect.top + 5, 4, PLAYER_HEIGHT - 10)
+    player_right_detector = pygame.Rect(player_rect.right - 2, player_rect.top + 5, 4, PLAYER_HEIGHT - 10)
+
+    wall_left_contact = bool(sim.wall_index.query_rect(player_left_detector, sim.camera_x_offset)) or \
+        any(p.height > PLAYER_HEIGHT for p in sim.platform_index.query_rect(player_left_detector, sim.camera_x_offset))
+    wall_right_contact = bool(sim.wall_index.query_rect(player_right_detector, sim.camera_x_offset)) or \
+        any(p.height > PLAYER_HEIGHT for p in sim.platform_index.query_rect(player_right_detector, sim.camera_x_offset))
+
+    if wall_left_contact and inputs.right:
+        sim.player_vel_y = WALL_JUMP_VERTICAL_PUSH
+        player_pos[0] += WALL_JUMP_HORIZONTAL_PUSH
+        sim.is_jumping = True
+        sim.sounds.append('wall_jump')
+    elif wall_right_contact and inputs.left:
+        sim.player_vel_y = WALL_JUMP_VERTICAL_PUSH
+        player_pos[0] -= WALL_JUMP_HORIZONTAL_PUSH
+        sim.is_jumping = True
+        sim.sounds.append('wall_jump')
+    elif not sim.is_jumping:
+        sim.player_vel_y = JUMP_STRENGTH
+        sim.is_jumping = True
+        sim.sounds.append('jump')
+
+def fire_laser(sim, target_x, target_y):
+    player_center_x = sim.player_pos[0] + PLAYER_WIDTH // 2
+    player_center_y = sim.player_pos[1] + PLAYER_HEIGHT // 2
+    
+    dx = target_x - player_center_x
+    dy = target_y - player_center_y
+    
+    magnitude = math.sqrt(dx**2 + dy**2)
+    if magnitude > 0:
+        norm_dx = dx / magnitude
+        norm_dy = dy / magnitude
+    else:
+        norm_dx = 1
+        norm_dy = 0
+        
+    if sim.laser_pool.fire(player_center_x, player_center_y,
+                           norm_dx * LASER_SPEED_MAGNITUDE, norm_dy * LASER_SPEED_MAGNITUDE):
+        sim.sounds.append('shoot')
+
+def save_previous_state(sim):
+    sim.prev_player_pos[:] = sim.player_pos
+    sim.prev_camera_x_offset = sim.camera_x_offset
+    sim.enemy_store.snapshot()
+    sim.laser_pool.snapshot()
 
-    if game_state == PLAYING:
-        handle_music_playback(dt)
-
-        keys = pygame.key.get_pressed()
-        moving_left = keys[pygame.K_LEFT] or keys[pygame.K_a]
-        moving_right = keys[pygame.K_RIGHT] or keys[pygame.K_d]
-
-        if moving_right:
-            camera_x_offset += PLAYER_SPEED
-        elif moving_left:
-            if camera_x_offset > 0:
-                camera_x_offset -= PLAYER_SPEED
-
-        player_vel_y += GRAVITY
-        player_pos[1] += player_vel_y
-
-        player_pos[1] = clamp(player_pos[1], 0, SCREEN_HEIGHT - PLAYER_HEIGHT)
-
-        player_rect = pygame.Rect(player_pos[0], player_pos[1], PLAYER_WIDTH, PLAYER_HEIGHT)
-
-        on_ground = False
-
-        for p in platforms:
-            adjusted_platform_rect = p.move(-camera_x_offset, 0)
-            if player_rect.colliderect(adjusted_platform_rect) and player_vel_y >= 0:
-                if player_pos[1] + PLAYER_HEIGHT >= adjusted_platform_rect.top and player_pos[1] < adjusted_platform_rect.top + PLATFORM_HEIGHT:
-                    player_pos[1] = adjusted_platform_rect.top - PLAYER_HEIGHT
-                    player_vel_y = 0
-                    is_jumping = False
-                    on_ground = True
-        if not on_ground and player_vel_y > 0:
-            player_left_side_detector = pygame.Rect(player_rect.left - 2, player_rect.top + 5, 4, PLAYER_HEIGHT - 10)
-            player_right_side_detector = pygame.Rect(player_rect.right - 2, player_rect.top + 5, 4, PLAYER_HEIGHT - 10)
-
-            for wall_obj in walls + platforms:
-                adjusted_wall_obj_rect = wall_obj.move(-camera_x_offset, 0)
-                
-                if player_left_side_detector.colliderect(adjusted_wall_obj_rect) and (keys[pygame.K_LEFT] or keys[pygame.K_a]):
-                    is_jumping = True
-                    break
-                elif player_right_side_detector.colliderect(adjusted_wall_obj_rect) and (keys[pygame.K_RIGHT] or keys[pygame.K_d]):
-                    player_vel_y = WALL_SLIDE_SPEED
-                    player_vel_y = WALL_SLIDE_SPEED
-                    is_jumping = True
-                    break
-        if player_pos[1] > SCREEN_HEIGHT:
-            score += DEATH_BONUS
-            game_state = GAME_OVER_STATE
-            stop_all_music()
-            play_tone(MUSIC_NOTES_FREQ['C4'] / 2, 200, 0.3)
-
-
-        enemies_to_remove = []
-        for enemy in enemies:
-            enemy_rect_adjusted = enemy['rect'].move(-camera_x_offset, 0)
-
-            if enemy['type'] == 'flying':
-                enemy['rect'].x += enemy['vx']
-                if enemy['rect'].left <= 0 or enemy['rect'].right >= SCREEN_WIDTH * 5:
-                    enemy['vx'] *= -1
-            
-            elif enemy['type'] == 'rolling':
-                enemy['vy'] += GRAVITY
-                enemy['rect'].y += enemy['vy']
-
-                on_platform = False
-                for p in platforms:
-                    adjusted_p_rect = p.move(-camera_x_offset, 0)
-                    if enemy['rect'].colliderect(adjusted_p_rect) and enemy['vy'] >= 0:
-                        if enemy['rect'].y + ENEMY_HEIGHT >= adjusted_p_rect.top and enemy['rect'].y < adjusted_p_rect.top + PLATFORM_HEIGHT:
-                            enemy['rect'].y = adjusted_p_rect.top - ENEMY_HEIGHT
-                            enemy['vy'] = 0
-                            on_platform = True
-                            break
-
-                if on_platform:
-                    enemy['rect'].x += enemy['vx']
-                    if enemy['rect'].x < enemy['walk_start_x'] or \
-                       enemy['rect'].x + enemy['rect'].width > enemy['walk_end_x']:
-                        enemy['vx'] *= -1
-                else:
-                    if enemy['rect'].y > SCREEN_HEIGHT + 50:
-                        enemies_to_remove.append(enemy['id'])
-
-
-            elif enemy['type'] == 'jumping':
-                enemy['vy'] += GRAVITY
-                enemy['rect'].y += enemy['vy']
-
-                on_platform = False
-                for p in platforms:
-                    adjusted_p_rect = p.move(-camera_x_offset, 0)
-                    if enemy['rect'].colliderect(adjusted_p_rect) and enemy['vy'] >= 0:
-                        if enemy['rect'].y + ENEMY_HEIGHT >= adjusted_p_rect.top and enemy['rect'].y < adjusted_p_rect.top + PLATFORM_HEIGHT:
-                            enemy['rect'].y = adjusted_p_rect.top - ENEMY_HEIGHT
-                            enemy['vy'] = 0
-                            enemy['is_jumping'] = False
-                            on_platform = True
-                            break
-                
-                if on_platform:
-                    enemy['current_jump_cooldown'] -= 1
-                    if enemy['current_jump_cooldown'] <= 0:
-                        enemy['vy'] = JUMP_STRENGTH * 0.8
-                        enemy['is_jumping'] = True
-                        enemy['current_jump_cooldown'] = enemy['jump_cooldown']
-                else:
-                    if enemy['rect'].y > SCREEN_HEIGHT + 50:
-                        enemies_to_remove.append(enemy['id'])
-
-            elif enemy['type'] == 'standard':
-                enemy['vy'] += GRAVITY
-                enemy['rect'].y += enemy['vy']
-                on_platform = False
-                for p in platforms:
-                    adjusted_p_rect = p.move(-camera_x_offset, 0)
-                    if enemy['rect'].colliderect(adjusted_p_rect) and enemy['vy'] >= 0:
-                        if enemy['rect'].y + ENEMY_HEIGHT >= adjusted_p_rect.top and enemy['rect'].y < adjusted_p_rect.top + PLATFORM_HEIGHT:
-                            enemy['rect'].y = adjusted_p_rect.top - ENEMY_HEIGHT
-                            enemy['vy'] = 0
-                            on_platform = True
-                            break
-                if not on_platform and enemy['rect'].y > SCREEN_HEIGHT + 50:
-                    enemies_to_remove.append(enemy['id'])
-
-
-            if enemy['id'] not in enemies_to_remove:
-                if check_collision(player_rect, enemy_rect_adjusted):
-                    health -= ENEMY_CONTACT_DAMAGE / FPS
-                    if health <= 0:
-                        game_state = GAME_OVER_STATE
-                        stop_all_music()
-                        play_tone(MUSIC_NOTES_FREQ['C4'], 200, 0.3)
-                    player_pos[0] += (15 if player_pos[0] < enemy_rect_adjusted.centerx else -15)
-                    play_tone(MUSIC_NOTES_FREQ['F4'] * 0.5, 50, 0.1)
-
-        lasers_to_remove_indices = []
-        for i, laser in enumerate(lasers):
-            laser['rect'].x += laser['vx']
-            laser['rect'].y += laser['vy']
-
-            if laser['rect'].x > SCREEN_WIDTH or laser['rect'].x < 0 or \
-               laser['rect'].y > SCREEN_HEIGHT or laser['rect'].y < 0:
-                lasers_to_remove_indices.append(i)
-                continue
+def end_game(sim, sound):
+    sim.game_over = True
+    sim.music_events.append((stop_all_music, ()))
+    sim.sounds.append(sound)
 
-            for enemy in enemies:
-                if enemy['id'] in enemies_to_remove:
-                    continue
-
-                enemy_rect_adjusted = enemy['rect'].move(-camera_x_offset, 0)
-                if check_collision(laser['rect'], enemy_rect_adjusted):
-                    enemy['health'] -= PLAYER_LASER_DAMAGE
-                    if enemy['health'] <= 0:
-                        enemies_to_remove.append(enemy['id'])
-                        play_tone(MUSIC_NOTES_FREQ['G4'] / 2, 100, 0.2)
-                    else:
-                        play_tone(MUSIC_NOTES_FREQ['G4'] * 1.5, 50, 0.15)
-                    
-                    lasers_to_remove_indices.append(i)
-                    score += 10
-                    break
-
-        lasers = [laser for i, laser in enumerate(lasers) if i not in lasers_to_remove_indices]
-        enemies[:] = [enemy for enemy in enemies if enemy['id'] not in enemies_to_remove]
-
-    screen.fill(COLORS["SKY"])
-
-    if game_state == PLAYING or game_state == GAME_OVER_STATE:
-        for p in platforms:
-            pygame.draw.rect(screen, COLORS["PLATFORM"], p.move(-camera_x_offset, 0))
-            pygame.draw.line(screen, COLORS["DARK_ACCENT"], (p.left - camera_x_offset, p.top), (p.right - camera_x_offset, p.top), 3)
-
-        for w in walls:
-            pygame.draw.rect(screen, COLORS["WALL"], w.move(-camera_x_offset, 0))
-            pygame.draw.line(screen, COLORS["DARK_ACCENT"], (w.left - camera_x_offset, w.top), (w.left - camera_x_offset, w.bottom), 3)
-            pygame.draw.line(screen, COLORS["DARK_ACCENT"], (w.right - camera_x_offset, w.top), (w.right - camera_x_offset, w.bottom), 3)
-
-
-        draw_player(screen, player_rect, COLORS["PLAYER"])
-
-        for enemy in enemies:
-            enemy_rect_draw = enemy['rect'].move(-camera_x_offset, 0)
-            if enemy['type'] == 'standard': draw_enemy_standard(screen, enemy_rect_draw, COLORS["ENEMY_STANDARD"])
-            elif enemy['type'] == 'flying': draw_enemy_flying(screen, enemy_rect_draw, COLORS["ENEMY_FLYING"])
-            elif enemy['type'] == 'rolling': draw_enemy_rolling(screen, enemy_rect_draw, COLORS["ENEMY_ROLLING"])
-            elif enemy['type'] == 'jumping': draw_enemy_jumping(screen, enemy_rect_draw, COLORS["ENEMY_JUMPING"])
-            
-        for laser in lasers:
-            pygame.draw.rect(screen, COLORS["LASER"], laser['rect'])
+def advance_world(sim, inputs):
+    save_previous_state(sim)
+
+    if inputs.jump:
+        player_jump(sim, inputs)
+
+    if inputs.regenerate:
+        if sim.player_pos[1] + PLAYER_HEIGHT < SCREEN_HEIGHT:
+            regenerate_world_in_place(sim)
 
-        draw_text(screen, f"Score: {score}", 30, 10, 10, COLORS["MENU_TEXT"])
-        draw_text(screen, f"Health: {max(0, int(health))}", 30, 10, 40, COLORS["MENU_TEXT"] if health > 30 else RED)
+    if inputs.cycle_theme:
+        sim.theme_index = (sim.theme_index + 1) % len(COLOR_THEMES)
+        sim.sounds.append('theme')
+
+    for target_x, target_y in inputs.shots:
+        fire_laser(sim, target_x, target_y)
+
+    if inputs.right:
+        sim.camera_x_offset += PLAYER_SPEED
+    elif inputs.left:
+        if sim.camera_x_offset > 0:
+            sim.camera_x_offset -= PLAYER_SPEED
+
+    update_world_chunks(sim)
+
+def advance_player(sim, inputs):
+    player_pos = sim.player_pos
+    sim.player_vel_y += GRAVITY
+    player_pos[1] += sim.player_vel_y
+
+    player_pos[1] = clamp(player_pos[1], 0, SCREEN_HEIGHT - PLAYER_HEIGHT)
+
+    player_rect = pygame.Rect(player_pos[0], player_pos[1], PLAYER_WIDTH, PLAYER_HEIGHT)
+
+    on_ground = False
+
+    if sim.player_vel_y >= 0:
+        for p in sim.platform_index.query_rect(player_rect, sim.camera_x_offset):
+            if player_pos[1] + PLAYER_HEIGHT >= p.top and player_pos[1] < p.top + PLATFORM_HEIGHT:
+                player_pos[1] = p.top - PLAYER_HEIGHT
+                sim.player_vel_y = 0
+                sim.is_jumping = False
+                on_ground = True
+    if not on_ground and sim.player_vel_y > 0:
+        player_left_side_detector = pygame.Rect(player_rect.left - 2, player_rect.top + 5, 4, PLAYER_HEIGHT - 10)
+        player_right_side_detector = pygame.Rect(player_rect.right - 2, player_rect.top + 5, 4, PLAYER_HEIGHT - 10)
+
+        touching_left = sim.wall_index.query_rect(player_left_side_detector, sim.camera_x_offset) or \
+            sim.platform_index.query_rect(player_left_side_detector, sim.camera_x_offset)
+        touching_right = sim.wall_index.query_rect(player_right_side_detector, sim.camera_x_offset) or \
+            sim.platform_index.query_rect(player_right_side_detector, sim.camera_x_offset)
+
+        if touching_left and inputs.left:
+            sim.is_jumping = True
+        elif touching_right and inputs.right:
+            sim.player_vel_y = WALL_SLIDE_SPEED
+            sim.is_jumping = True
+    if player_pos[1] > SCREEN_HEIGHT:
+        sim.score += DEATH_BONUS
+        end_game(sim, 'fall')
+
+def advance_enemies(sim, inputs):
+    update_enemies(sim)
+
+    player_pos = sim.player_pos
+    camera_x_offset = sim.camera_x_offset
+    player_rect = pygame.Rect(player_pos[0], player_pos[1], PLAYER_WIDTH, PLAYER_HEIGHT)
+    for slot in sim.enemy_store.overlapping(player_rect.left + camera_x_offset, player_rect.top,
+                                            player_rect.right + camera_x_offset, player_rect.bottom):
+        sim.health -= ENEMY_CONTACT_DAMAGE * SIM_DT
+        if sim.health <= 0:
+            end_game(sim, 'death')
+        enemy_center_x = sim.enemy_store.x[slot] - camera_x_offset + ENEMY_WIDTH / 2
+        player_pos[0] += (15 if player_pos[0] < enemy_center_x else -15)
+        sim.sounds.append('hurt')
+
+def advance_lasers(sim, inputs):
+    enemy_store = sim.enemy_store
+    laser_pool = sim.laser_pool
+    laser_pool.advance()
+
+    enemies_killed = np.zeros(enemy_store.count, dtype=bool)
+    hits = laser_pool.enemy_hits(enemy_store, sim.camera_x_offset)
+    lasers_spent = []
+    for laser_slot in np.flatnonzero(hits.any(axis=1)):
+        targets = np.flatnonzero(hits[laser_slot] & ~enemies_killed)
+        if not targets.size:
+            continue
+        slot = targets[0]
+        enemy_store.health[slot] -= PLAYER_LASER_DAMAGE
+        if enemy_store.health[slot] <= 0:
+            enemies_killed[slot] = True
+            sim.sounds.append('kill')
+        else:
+            sim.sounds.append('hit')
+
+        lasers_spent.append(laser_slot)
+        sim.score += 10
+
+    laser_pool.remove_slots(lasers_spent)
+    enemy_store.remove_slots(np.flatnonzero(enemies_killed))
+
+# One simulation tick, in order; the frame loop takes a profiler lap after
+# each phase.
+SIM_PHASES = (
+    (PHASE_WORLD, advance_world),
+    (PHASE_PHYSICS, advance_player),
+    (PHASE_ENEMIES, advance_enemies),
+    (PHASE_LASERS, advance_lasers),
+)
+
+def step(sim, inputs):
+    if not sim.game_over:
+        for _, advance in SIM_PHASES:
+            advance(sim, inputs)
+    return sim
+
+def profiled_step(sim, inputs):
+    if not sim.game_over:
+        for phase, advance in SIM_PHASES:
+            advance(sim, inputs)
+            profile_lap(phase)
+    return sim
+
+
+def render_frame(sim, alpha=1.0):
+    global start_button_rect, quit_button_rect, tutorial_button_rect, game_info_button_rect, tutorial_back_button_rect
+    global last_view_key, menu_hover_rect, current_theme_index
+
+    if sim.theme_index != current_theme_index:
+        current_theme_index = sim.theme_index
+        update_colors_from_theme()
+
+    view_key = (game_state, current_theme_index, sim.current_map_seed, sim.score)
+    if game_state == PLAYING or view_key != last_view_key:
+        request_full_redraw()
+        last_view_key = view_key
+
+    if game_state == PLAYING or (game_state == GAME_OVER_STATE and full_redraw):
+        view_x = lerp(sim.prev_camera_x_offset, sim.camera_x_offset, alpha)
+        draw_terrain(screen, sim.world_chunks, view_x)
+        profile_lap(PHASE_TERRAIN)
+
+        player_rect = pygame.Rect(lerp(sim.prev_player_pos[0], sim.player_pos[0], alpha),
+                                  lerp(sim.prev_player_pos[1], sim.player_pos[1], alpha),
+                                  PLAYER_WIDTH, PLAYER_HEIGHT)
+        blit_sprite(screen, draw_player, player_rect, COLORS["PLAYER"])
+
+        enemy_store = sim.enemy_store
+        for slot in enemy_store.overlapping(view_x - ENEMY_WIDTH, -ENEMY_HEIGHT,
+                                            view_x + SCREEN_WIDTH + ENEMY_WIDTH, SCREEN_HEIGHT + ENEMY_HEIGHT):
+            enemy_type = enemy_store.type[slot]
+            frame = int(enemy_store.x[slot] // ROLLING_FRAME_STEP) % ROLLING_FRAMES if enemy_type == ENEMY_ROLLING else 0
+            blit_sprite(screen, ENEMY_DRAWERS[enemy_type], enemy_store.rect(slot, view_x, alpha),
+                        COLORS[ENEMY_COLOR_KEYS[enemy_type]], frame)
+            
+        laser_pool = sim.laser_pool
+        for slot in range(laser_pool.count):
+            laser_x = lerp(laser_pool.prev_x[slot], laser_pool.x[slot], alpha)
+            laser_y = lerp(laser_pool.prev_y[slot], laser_pool.y[slot], alpha)
+            pygame.draw.rect(screen, COLORS["LASER"], (laser_x, laser_y, LASER_WIDTH, LASER_HEIGHT))
+        profile_lap(PHASE_ENTITIES)
+
+        draw_text(screen, f"Score: {sim.score}", 30, 10, 10, COLORS["MENU_TEXT"])
+        draw_text(screen, f"Health: {max(0, int(sim.health))}", 30, 10, 40, COLORS["MENU_TEXT"] if sim.health > 30 else RED)
         draw_text(screen, "Controls: Arrows/WASD, Space/Up to Jump, Click to Shoot, R for New Map, C for Colors", 20, 10, SCREEN_HEIGHT - 30, COLORS["MENU_TEXT"])
 
     if game_state == GAME_OVER_STATE:
-        overlay = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
-        overlay.fill((0, 0, 0, 180))
-        screen.blit(overlay, (0,0))
-        
-        draw_text(screen, "GAME OVER", 80, SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 - 50, RED, anchor='center')
-        draw_text(screen, f"Final Score: {score}", 40, SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 + 20, COLORS["MENU_TEXT"], anchor='center')
-        draw_text(screen, "Press R for New Game or ESC to Quit", 30, SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 + 80, COLORS["MENU_TEXT"], anchor='center')
+        if full_redraw:
+            screen.blit(get_game_over_overlay(), (0, 0))
+
+            draw_text(screen, "GAME OVER", 80, SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 - 50, RED, anchor='center')
+            draw_text(screen, f"Final Score: {sim.score}", 40, SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 + 20, COLORS["MENU_TEXT"], anchor='center')
+            draw_text(screen, "Press R for New Game or ESC to Quit", 30, SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 + 80, COLORS["MENU_TEXT"], anchor='center')
 
     elif game_state == MENU:
-        screen.fill(COLORS["MENU_BG"])
-        draw_text(screen, "Procedural Jump & Run", 60, SCREEN_WIDTH // 2, SCREEN_HEIGHT // 4, COLORS["MENU_TEXT"], anchor='center')
-        
+        menu_surface, menu_buttons = get_static_screen(MENU)
+        start_button_rect, tutorial_button_rect, game_info_button_rect, quit_button_rect = menu_buttons
+        if full_redraw:
+            screen.blit(menu_surface, (0, 0))
+            menu_hover_rect = None
+
         mouse_pos = pygame.mouse.get_pos()
+        hovered_rect = next((button for button in menu_buttons if button.collidepoint(mouse_pos)), None)
+        if hovered_rect != menu_hover_rect:
+            if menu_hover_rect:
+                highlight = menu_hover_rect.inflate(10, 10)
+                screen.blit(menu_surface, highlight, highlight)
+                mark_dirty(highlight)
+            if hovered_rect:
+                highlight = hovered_rect.inflate(10, 10)
+                pygame.draw.rect(screen, COLORS["MENU_HOVER_FILL"], highlight)
+                mark_dirty(highlight)
+            menu_hover_rect = hovered_rect
+
+        if menu_click is not None:
+            flash = menu_click[0].inflate(15, 15)
+            pygame.draw.rect(screen, COLORS["MENU_CLICK_FLASH"], flash)
+            mark_dirty(flash)
+
+    elif game_state == TUTORIAL or game_state == GENERATION_INFO:
+        static_surface, (tutorial_back_button_rect,) = get_static_screen(game_state)
+        if full_redraw:
+            screen.blit(static_surface, (0, 0))
+    profile_lap(PHASE_HUD)
+
+    if profiler_enabled:
+        draw_profiler_overlay(screen)
+        profile_lap(PHASE_OVERLAY)
+
+    present()
+    profile_lap(PHASE_PRESENT)
+
+
+def merge_inputs(pending, inputs):
+    return FrameInputs(inputs.left, inputs.right, pending.jump or inputs.jump, pending.regenerate or inputs.regenerate,
+                       pending.cycle_theme or inputs.cycle_theme, pending.shots + inputs.shots)
+
+def game_loop():
+    global sim_accumulator, pending_inputs, frame_clock_ms, game_state
+
+    profile_begin_frame()
+    inputs = poll_inputs()
+    if inputs is None:
+        stop_all_music()
+        return False
+    profile_lap(PHASE_EVENTS)
+
+    # Edge-triggered inputs wait for the next simulation tick, which may be a
+    # few render frames away when rendering faster than SIM_DT.
+    pending_inputs = merge_inputs(pending_inputs, inputs)
+    frame_ms = clock.tick(MAX_RENDER_FPS if game_state == PLAYING else FPS)
+    frame_clock_ms += frame_ms
+    frame_time = frame_ms / 1000.0
+    sim_accumulator += min(frame_time, MAX_FRAME_TIME)
+    profile_lap(PHASE_WAIT)
+
+    while sim_accumulator >= SIM_DT:
+        if game_state == PLAYING:
+            if input_recorder is not None:
+                input_recorder.record(pending_inputs)
+            profiled_step(current_sim, pending_inputs)
+            if current_sim.game_over:
+                game_state = GAME_OVER_STATE
+        pending_inputs = pending_inputs._replace(jump=False, regenerate=False, cycle_theme=False, shots=())
+        sim_accumulator -= SIM_DT
+
+    play_sim_audio(current_sim)
+    if game_state == PLAYING:
+        profile_audio(handle_music_playback, current_sim)
 
-        start_button_rect = draw_text(screen, "START GAME", 50, SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 - 40, COLORS["MENU_START_BTN"], anchor='center')
-        if start_button_rect.collidepoint(mouse_pos):
-            pygame.draw.rect(screen, COLORS["MENU_HOVER_FILL"], start_button_rect.inflate(10, 10))
+    render_frame(current_sim, sim_accumulator / SIM_DT)
+    if startup_tasks or first_frame_time is None:
+        run_startup_task()
 
-        tutorial_button_rect = draw_text(screen, "HOW TO PLAY", 50, SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 + 40, COLORS["MENU_TUTORIAL_BTN"], anchor='center')
-        if tutorial_button_rect.collidepoint(mouse_pos):
-            pygame.draw.rect(screen, COLORS["MENU_HOVER_FILL"], tutorial_button_rect.inflate(10, 10))
+    return True
 
-        game_info_button_rect = draw_text(screen, "GAME DETAILS", 50, SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 + 120, COLORS["MENU_INFO_BTN"], anchor='center')
-        if game_info_button_rect.collidepoint(mouse_pos):
-            pygame.draw.rect(screen, COLORS["MENU_HOVER_FILL"], game_info_button_rect.inflate(10, 10))
-        
-        quit_button_rect = draw_text(screen, "QUIT", 50, SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 + 200, COLORS["MENU_QUIT_BTN"], anchor='center')
-        if quit_button_rect.collidepoint(mouse_pos):
-            pygame.draw.rect(screen, COLORS["MENU_HOVER_FILL"], quit_button_rect.inflate(10, 10))
 
+HUD_FONT_SIZES = (18, 20, 30, 40, 80)
 
-    elif game_state == TUTORIAL:
-        screen.fill(BLACK)
-        draw_text(screen, "--- HOW TO PLAY ---", 60, SCREEN_WIDTH // 2, 50, COLORS["MENU_TEXT"], anchor='center')
-        
-        tutorial_text = [
-            "Your goal is to survive as long as possible and get a high score!",
-            "",
-            "CONTROLS:",
-            f"- Move Left:  <-- Arrow Key or 'A'",
-            f"- Move Right: --> Arrow Key or 'D'",
-            f"- Jump:       ^ Arrow Key or 'W' or SPACEBAR",
-            f"- Shoot Laser: LEFT MOUSE CLICK (aim with mouse cursor)",
-            f"- New Map:    Press 'R' (regenerate world around you, score persists!)",
-            f"- Change Colors: Press 'C' (cycle through visual themes)",
-            f"- Back/Quit:  Press 'ESC' (from any menu/info screen)",
-            "",
-            "ABILITIES:",
-            f"- Wall Run: While jumping, move against a {COLOR_TO_NAME[COLORS['WALL']]} wall to slide slowly.",
-            f"- Wall Jump: While wall running, press Jump again to leap off the wall!",
-            "",
-            "ENEMIES:",
-            f"- Player (You): A {COLOR_TO_NAME[COLORS['PLAYER']]} figure.",
-            f"- Standard Enemies: {COLOR_TO_NAME[COLORS['ENEMY_STANDARD']]} simple blocks (stationary, but fall with gravity).",
-            f"- Rolling Enemies:  {COLOR_TO_NAME[COLORS['ENEMY_ROLLING']]} spiky circles (patrol platforms).",
-            f"- Jumping Enemies:  {COLOR_TO_NAME[COLORS['ENEMY_JUMPING']]} bouncy blobs (periodically leap).",
-            f"- Flying Enemies:   {COLOR_TO_NAME[COLORS['ENEMY_FLYING']]} ellipses with wings (move horizontally in air).",
-            "  Beware! Contact with enemies damages your health!",
-            "",
-            "GAME FLOW:",
-            "Each map is randomly generated using advanced noise algorithms. ",
-            "Platforms, walls, and enemy placements are unique every time you press 'R'.",
-            "Your score and health persist when you regenerate the world in place!",
-            "",
-            "The 'art' of this game comes from the procedurally generated shapes and colors!",
-        ]
-        
-        text_y = 120
-        for line in tutorial_text:
-            draw_text(screen, line, 25, SCREEN_WIDTH // 2, text_y, COLORS["MENU_TEXT"], anchor='center')
-            text_y += 30
-
-        tutorial_back_button_rect = draw_text(screen, "BACK TO MENU", 40, SCREEN_WIDTH // 2, SCREEN_HEIGHT - 60, COLORS["MENU_START_BTN"], anchor='center')
-
-    elif game_state == GENERATION_INFO:
-        screen.fill(BLACK)
-        draw_text(screen, "--- GAME GENERATION DETAILS ---", 60, SCREEN_WIDTH // 2, 50, COLORS["MENU_TEXT"], anchor='center')
-
-        info_text = [
-            f"Current Map Seed: {current_map_seed}",
-            f"Noise Scale (Roughness): {NOISE_SCALE}",
-            f"Noise Octaves (Detail): {OCTAVES}",
-            "",
-            "Procedural Art (Colors & Shapes - Cycle with 'C'):",
-            f"- Player Color: {COLOR_TO_NAME[COLORS['PLAYER']]}",
-            f"- Platform Color: {COLOR_TO_NAME[COLORS['PLATFORM']]}",
-            f"- Wall Color: {COLOR_TO_NAME[COLORS['WALL']]}",
-            f"- Laser Color: {COLOR_TO_NAME[COLORS['LASER']]}",
-            "",
-            "Enemy Types (Colors & Behavior):",
-            f"- Standard Enemy: {COLOR_TO_NAME[COLORS['ENEMY_STANDARD']]}",
-            f"- Flying Enemy:   {COLOR_TO_NAME[COLORS['ENEMY_FLYING']]}",
-            f"- Rolling Enemy:  {COLOR_TO_NAME[COLORS['ENEMY_ROLLING']]}",
-            f"- Jumping Enemy:  {COLOR_TO_NAME[COLORS['ENEMY_JUMPING']]}",
-            "",
-            "Procedural Music:",
-            "  A simple, randomized chiptune-like melody plays during the game.",
-            "  Each new map (generated with 'R') will generate a unique sequence of notes!",
-            "",
-            "NOTE ON CUSTOMIZATION (Image/Music):",
-            "This game is designed to run purely locally on your computer with Pygame.",
-            "It does NOT use external AI services for image or complex music generation",
-            "to ensure it remains completely free and does NOT require internet access or",
-            "API keys, preventing any potential costs for you."
-        ]
-
-        text_y = 120
-        for line in info_text:
-            draw_text(screen, line, 25, SCREEN_WIDTH // 2, text_y, COLORS["MENU_TEXT"], anchor='center')
-            text_y += 30
-
-        tutorial_back_button_rect = draw_text(screen, "BACK TO MENU", 40, SCREEN_WIDTH // 2, SCREEN_HEIGHT - 60, COLORS["MENU_START_BTN"], anchor='center')
-
-
-    pygame.display.flip()
-
-    clock.tick(FPS)
+def warm_static_screens():
+    for state in STATIC_SCREEN_BUILDERS:
+        get_static_screen(state)
 
-    return True
+def warm_hud_fonts():
+    for size in HUD_FONT_SIZES:
+        get_font(size)
 
-pygame.init()
-screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
-def reset_game():
-    global player_pos, player_vel_y, is_jumping, score, health, game_over, camera_x_offset, lasers, enemies, current_map_seed
-    
-    current_map_seed = random.randint(0, 1000000)
-    generate_platforms_and_walls()
+def prefetch_first_world():
+    schedule_prefetch(current_sim)
 
-    if platforms:
-        player_pos[0] = SCREEN_WIDTH // 4
-        player_pos[1] = platforms[0].y - PLAYER_HEIGHT
-    else:
-        player_pos = [SCREEN_WIDTH // 4, SCREEN_HEIGHT - PLAYER_HEIGHT - 50]
-
-    player_vel_y = 0
-    is_jumping = False
-    score = 0
-    health = 100
-    game_over = False
-    camera_x_offset = 0
-    lasers.clear()
-    enemies.clear()
-    spawn_enemies()
-    generate_random_melody()
-    
-    global current_music_note_idx, music_timer
-    current_music_note_idx = 0
-    music_timer = 0
+# Run one per frame behind the menu so the first frame doesn't wait on them.
+STARTUP_TASKS = (ensure_mixer, build_sfx_bank, prefetch_first_world, warm_static_screens, warm_hud_fonts)
+startup_tasks = []
+first_frame_time = None
+startup_ready_time = None
 
+def run_startup_task():
+    global first_frame_time, startup_ready_time
+    if first_frame_time is None:
+        first_frame_time = time.perf_counter() - STARTUP_TIME
+        return
+    startup_tasks.pop(0)()
+    if not startup_tasks:
+        startup_ready_time = time.perf_counter() - STARTUP_TIME
+
+def init_display():
+    global screen
+    # Only video is needed for the menu; fonts and the mixer start on first use.
+    pygame.display.init()
+    screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+
+def start_map(sim, seed):
+    sim.current_map_seed = seed
+    melody = take_prefetched_world(sim, seed)
+    generate_platforms_and_walls(sim)
+    sim.laser_pool.clear()
+    if melody is None:
+        melody = (draw_melody_sequence(sim), None)
+    sim.music_events.append((start_map_music, melody))
+
+def reset_game(sim, seed=None, start_score=0):
+    sim.score = start_score
+    sim.camera_x_offset = 0
+    start_map(sim, next_map_seed(sim) if seed is None else seed)
+
+    if sim.platforms:
+        sim.player_pos[:] = [SCREEN_WIDTH // 4, sim.platforms[0].y - PLAYER_HEIGHT]
+    else:
+        sim.player_pos[:] = [SCREEN_WIDTH // 4, SCREEN_HEIGHT - PLAYER_HEIGHT - 50]
 
-def regenerate_world_in_place():
-    global player_pos, player_vel_y, is_jumping
-    global camera_x_offset, current_map_seed, lasers, enemies
+    sim.player_vel_y = 0
+    sim.is_jumping = False
+    sim.health = 100
+    sim.game_over = False
+    save_previous_state(sim)
+    schedule_prefetch(sim)
+    return sim
 
-    old_world_x = player_pos[0] + camera_x_offset
 
-    current_map_seed = random.randint(0, 1000000)
-    generate_platforms_and_walls()
-    enemies.clear()
-    lasers.clear()
-    spawn_enemies()
-    generate_random_melody()
+def regenerate_world_in_place(sim):
+    old_world_x = sim.player_pos[0] + sim.camera_x_offset
 
-    player_vel_y = 0
-    is_jumping = False
+    start_map(sim, next_map_seed(sim))
 
-    target_platform = None
-    for p in platforms:
-        if p.x <= old_world_x <= p.x + p.width:
-            target_platform = p
-            break
-    if not target_platform and platforms:
-        target_platform = min(platforms, key=lambda p: abs((p.x + p.width/2) - old_world_x))
+    sim.player_vel_y = 0
+    sim.is_jumping = False
 
+    target_platform = sim.platform_index.nearest(old_world_x)
     if target_platform:
-        camera_x_offset = max(0, int(target_platform.x - player_pos[0]))
+        sim.camera_x_offset = max(0, int(target_platform.x - sim.player_pos[0]))
+    save_previous_state(sim)
+    schedule_prefetch(sim)
+
+
+def start_game():
+    global game_state
+    game_state = PLAYING
+    reset_game(current_sim)
+    if input_recorder is not None:
+        input_recorder.restart_pending = True
+
+
+def idle_bot(sim, frame):
+    return NO_INPUT
+
+def runner_bot(sim, frame):
+    shots = ((sim.player_pos[0] + SCREEN_WIDTH // 2, sim.player_pos[1] + PLAYER_HEIGHT // 2),) if frame % 10 == 0 else ()
+    return FrameInputs(False, True, frame % 40 == 0, False, False, shots)
+
+def random_bot(sim, frame):
+    rng = sim.rng_streams['bot']
+    left, right, jump, shoot = rng.random(4) < (0.3, 0.6, 0.05, 0.1)
+    shots = ((int(rng.integers(SCREEN_WIDTH)), int(rng.integers(SCREEN_HEIGHT))),) if shoot else ()
+    return FrameInputs(bool(left), bool(right), bool(jump), False, False, shots)
 
-    global current_music_note_idx, music_timer
-    current_music_note_idx = 0
-    music_timer = 0
+BOTS = {'idle': idle_bot, 'runner': runner_bot, 'random': random_bot}
+
+def run_headless(frames, seed=None, bot='runner', tier=0, restart=True, map_seed=None):
+    global audio_enabled
+
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+    audio_enabled = False
+    update_colors_from_theme()
+
+    start_score = DIFFICULTY_TIERS[tier]["score"]
+    sim = reset_game(SimState(seed, map_seed), start_score=start_score)
+    bot_inputs = BOTS[bot]
+
+    deaths = 0
+    max_score = sim.score
+    max_distance = 0
+    frames_run = 0
+    start_time = time.perf_counter()
+    for frame in range(frames):
+        step(sim, bot_inputs(sim, frame))
+        # Nothing is heard headless.
+        sim.take_audio()
+        frames_run += 1
+        max_score = max(max_score, sim.score)
+        max_distance = max(max_distance, sim.camera_x_offset)
+        if sim.game_over:
+            deaths += 1
+            if not restart:
+                break
+            reset_game(sim, start_score=start_score)
+    elapsed = time.perf_counter() - start_time
+    sim.level_cache.flush()
+
+    return {
+        "frames": frames_run,
+        "seconds": round(elapsed, 3),
+        "fps": round(frames_run / elapsed, 1) if elapsed > 0 else None,
+        "seed": sim.session_seed,
+        "bot": bot,
+        "tier": tier,
+        "deaths": deaths,
+        "max_score": max_score,
+        "max_distance": max_distance,
+        "enemies_alive": sim.enemy_store.count,
+    }
+
+
+REPLAY_MAGIC = b'PJRR'
+REPLAY_VERSION = 1
+REPLAY_HEADER = struct.Struct('<4sBI')
+REPLAY_TICK = struct.Struct('<BB')
+REPLAY_SHOT = struct.Struct('<hh')
+REPLAY_FLUSH_TICKS = 60
+INPUT_FLAGS = ('left', 'right', 'jump', 'regenerate', 'cycle_theme')
+RESTART_FLAG = 1 << len(INPUT_FLAGS)
+
+class InputRecorder:
+    def __init__(self, path, seed):
+        self.path = path
+        self.file = open(path, 'wb')
+        self.data = bytearray(REPLAY_HEADER.pack(REPLAY_MAGIC, REPLAY_VERSION, seed))
+        self.ticks = 0
+        self.restart_pending = False
+
+    def record(self, inputs):
+        flags = RESTART_FLAG if self.restart_pending else 0
+        for bit, name in enumerate(INPUT_FLAGS):
+            if getattr(inputs, name):
+                flags |= 1 << bit
+        shots = inputs.shots[:255]
+        self.data += REPLAY_TICK.pack(flags, len(shots))
+        for x, y in shots:
+            self.data += REPLAY_SHOT.pack(int(x), int(y))
+        self.restart_pending = False
+        # Ticks go to disk about once a second so a crash loses at most the
+        # last second of the session.
+        self.ticks += 1
+        if self.ticks % REPLAY_FLUSH_TICKS == 0:
+            self.flush()
+
+    def flush(self):
+        self.file.write(self.data)
+        self.file.flush()
+        self.data.clear()
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+def read_recording(path):
+    with open(path, 'rb') as f:
+        data = f.read()
+    magic, version, seed = REPLAY_HEADER.unpack_from(data)
+    if magic != REPLAY_MAGIC or version != REPLAY_VERSION:
+        raise ValueError(f"{path} is not a version {REPLAY_VERSION} replay file")
+
+    ticks = []
+    offset = REPLAY_HEADER.size
+    while offset < len(data):
+        flags, shot_count = REPLAY_TICK.unpack_from(data, offset)
+        offset += REPLAY_TICK.size
+        shots = tuple(REPLAY_SHOT.unpack_from(data, offset + i * REPLAY_SHOT.size) for i in range(shot_count))
+        offset += shot_count * REPLAY_SHOT.size
+        held = [bool(flags & (1 << bit)) for bit in range(len(INPUT_FLAGS))]
+        ticks.append((bool(flags & RESTART_FLAG), FrameInputs(*held, shots)))
+    return seed, ticks
+
+def replay_recording(path, spikes=5):
+    global audio_enabled
+
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+    audio_enabled = False
+    update_colors_from_theme()
+
+    seed, ticks = read_recording(path)
+    sim = SimState(seed)
+
+    playing = False
+    tick_times = np.zeros(len(ticks))
+    start_time = time.perf_counter()
+    for tick, (restart, inputs) in enumerate(ticks):
+        tick_start = time.perf_counter()
+        if restart:
+            playing = True
+            reset_game(sim)
+        if playing:
+            step(sim, inputs)
+            sim.take_audio()
+        tick_times[tick] = time.perf_counter() - tick_start
+    elapsed = time.perf_counter() - start_time
+    sim.level_cache.flush()
+
+    slowest = np.argsort(tick_times)[::-1][:spikes]
+    return {
+        "ticks": len(ticks),
+        "seconds": round(elapsed, 3),
+        "seed": seed,
+        "map_seed": sim.current_map_seed,
+        "score": sim.score,
+        "health": round(sim.health, 3),
+        "camera_x_offset": sim.camera_x_offset,
+        "player_pos": [round(v, 3) for v in sim.player_pos],
+        "game_over": sim.game_over,
+        "slowest_ticks_ms": [[int(t), round(tick_times[t] * 1000, 3)] for t in slowest],
+    }
+
+
+def session_seed_arg(text):
+    # Session seeds feed np.random.default_rng and the replay header's
+    # unsigned 32-bit field.
+    seed = int(text)
+    if not 0 <= seed < 2 ** 32:
+        raise argparse.ArgumentTypeError(f"must be between 0 and {2 ** 32 - 1}, got {seed}")
+    return seed
+
+def map_seed_arg(text):
+    # Map seeds feed np.random.default_rng directly, which rejects negatives.
+    seed = int(text)
+    if seed < 0:
+        raise argparse.ArgumentTypeError(f"must be 0 or more, got {seed}")
+    return seed
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Procedurally generated platformer.")
+    parser.add_argument("--headless", action="store_true", help="run the simulation without a window or audio")
+    parser.add_argument("--frames", type=int, default=3600, help="frames to simulate in headless mode")
+    parser.add_argument("--seed", type=session_seed_arg, default=None, help="session seed (0 to 2**32-1); every map, melody and bot input is drawn from it")
+    parser.add_argument("--map-seed", type=map_seed_arg, default=None, help="play this map seed (as listed by batch_export.py) first instead of the session's own first map")
+    parser.add_argument("--bot", choices=sorted(BOTS), default="runner", help="input source in headless mode")
+    parser.add_argument("--tier", type=int, default=0, choices=range(len(DIFFICULTY_TIERS)), help="difficulty tier to start at")
+    parser.add_argument("--record", metavar="PATH", help="record this session's inputs to PATH")
+    parser.add_argument("--replay", metavar="PATH", help="re-run a recorded session headlessly and exit")
+    parser.add_argument("--daily", action="store_true", help="play today's seed")
+    parser.add_argument("--no-level-cache", action="store_true", help="don't read or write the on-disk level cache")
+    parser.add_argument("--profile", action="store_true", help="start with the frame profiler overlay on (toggle with F3)")
+    parser.add_argument("--profile-csv", metavar="PATH", default=PROFILE_CSV_PATH, help="where profiled frames are written on exit")
+    parser.add_argument("--pregenerate", type=int, metavar="CHUNKS", help="generate the first CHUNKS chunks of the session's first map into the level cache and exit")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="processes used by --pregenerate")
+    parser.add_argument("--startup-time", action="store_true", help="print time to first frame and to warmed-up menu as JSON, then exit")
+    args = parser.parse_args()
+    if args.record and args.map_seed is not None:
+        parser.error("--record can't be combined with --map-seed: a replay only stores the session seed")
+    level_cache_enabled = not args.no_level_cache
+    if args.daily:
+        args.seed = int(datetime.date.today().strftime('%Y%m%d'))
+
+    if args.replay:
+        summary = replay_recording(args.replay)
+        print(json.dumps(summary))
+        sys.exit(0)
+
+    if args.pregenerate:
+        if not level_cache_enabled:
+            parser.error("--pregenerate needs the level cache")
+        sim = SimState(args.seed, args.map_seed)
+        map_seed = peek_map_seed(sim)
+        start_time = time.perf_counter()
+        generated = pregenerate_level(map_seed, args.pregenerate, args.tier, args.workers)
+        print(json.dumps({
+            "seed": sim.session_seed,
+            "map_seed": map_seed,
+            "tier": args.tier,
+            "chunks": args.pregenerate,
+            "generated": generated,
+            "workers": args.workers,
+            "seconds": round(time.perf_counter() - start_time, 3),
+        }))
+        sys.exit(0 if level_cache_enabled else 1)
+
+    if args.headless:
+        summary = run_headless(args.frames, args.seed, args.bot, args.tier, map_seed=args.map_seed)
+        print(json.dumps(summary))
+        sys.exit(0)
+
+    current_sim = SimState(args.seed, args.map_seed)
+    current_sim.prefetcher = world_prefetcher
+    if args.profile:
+        toggle_profiler()
+    if args.record:
+        input_recorder = InputRecorder(args.record, current_sim.session_seed)
+
     running = True
     
     start_button_rect = pygame.Rect(0,0,0,0)
@@ -987,25 +2529,25 @@ if __name__ == "__main__":
     game_info_button_rect = pygame.Rect(0,0,0,0)
     tutorial_back_button_rect = pygame.Rect(0,0,0,0)
 
-    COLOR_TO_NAME = {
-        DEFAULT_BLUE_PLAYER: "Blue",
-        DEFAULT_RED_ENEMY_LASER: "Red",
-        DEFAULT_GREEN_PLATFORM: "Green",
-        DEFAULT_YELLOW_ROLLING: "Yellow",
-        DEFAULT_ORANGE_FLYING: "Orange",
-        DEFAULT_PURPLE_JUMPING: "Purple",
-        (80, 80, 80): "Dark Grey",
-    }
-    COLOR_TO_NAME[WHITE] = "White"
-    COLOR_TO_NAME[BLACK] = "Black"
-    COLOR_TO_NAME[DEFAULT_LIGHT_BLUE_SKY] = "Light Blue"
-
-    generate_random_melody()
+    init_display()
     update_colors_from_theme()
+    startup_tasks = list(STARTUP_TASKS)
 
     clock = pygame.time.Clock()
-    while running:
-        running = game_loop()
-
-    stop_all_music()
-    pygame.quit()
+    try:
+        while running:
+            running = game_loop()
+            if args.startup_time and startup_ready_time is not None:
+                print(json.dumps({
+                    'first_frame_ms': round(first_frame_time * 1000, 1),
+                    'ready_ms': round(startup_ready_time * 1000, 1),
+                }))
+                break
+    finally:
+        if input_recorder is not None:
+            input_recorder.close()
+        dump_profile_csv(args.profile_csv)
+        current_sim.level_cache.flush()
+        stop_all_music()
+        audio_worker.stop()
+        pygame.quit()
@@ -0,0 +1,62 @@
+import numpy as np
+
+
+def _lattice_hash(ix, iy, seed):
+    # Wrapping uint32 arithmetic is intended; NumPy only warns about it for
+    # 0-d inputs, which come through as scalars.
+    with np.errstate(over='ignore'):
+        h = ix.astype(np.uint32) * np.uint32(0x8DA6B343)
+        h ^= iy.astype(np.uint32) * np.uint32(0xD8163841)
+        h ^= np.uint32((seed * 0x9E3779B1) & 0xFFFFFFFF)
+        h ^= h >> np.uint32(16)
+        h *= np.uint32(0x7FEB352D)
+        h ^= h >> np.uint32(15)
+        h *= np.uint32(0x846CA68B)
+        h ^= h >> np.uint32(16)
+    return h
+
+def _gradient_dot(ix, iy, dx, dy, seed):
+    h = _lattice_hash(ix, iy, seed)
+    gx = (h & np.uint32(0xFFFF)) / 32767.5 - 1.0
+    gy = (h >> np.uint32(16)) / 32767.5 - 1.0
+    return gx * dx + gy * dy
+
+def _fade(t):
+    return t * t * t * (t * (t * 6 - 15) + 10)
+
+def gradient_noise(x, y, seed):
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    x, y = np.broadcast_arrays(x, y)
+
+    x0 = np.floor(x)
+    y0 = np.floor(y)
+    fx = x - x0
+    fy = y - y0
+    ix = x0.astype(np.int64)
+    iy = y0.astype(np.int64)
+
+    n00 = _gradient_dot(ix, iy, fx, fy, seed)
+    n10 = _gradient_dot(ix + 1, iy, fx - 1, fy, seed)
+    n01 = _gradient_dot(ix, iy + 1, fx, fy - 1, seed)
+    n11 = _gradient_dot(ix + 1, iy + 1, fx - 1, fy - 1, seed)
+
+    u = _fade(fx)
+    v = _fade(fy)
+    nx0 = n00 + u * (n10 - n00)
+    nx1 = n01 + u * (n11 - n01)
+    return nx0 + v * (nx1 - nx0)
+
+def fbm(x, y, seed, frequency=1.0, layers=1, lacunarity=2.0, gain=0.5):
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+
+    total = np.zeros(np.broadcast(x, y).shape)
+    amplitude = 1.0
+    amplitude_sum = 0.0
+    for layer in range(layers):
+        total += amplitude * gradient_noise(x * frequency, y * frequency, seed + layer)
+        amplitude_sum += amplitude
+        frequency *= lacunarity
+        amplitude *= gain
+    return total / amplitude_sum
@@ -0,0 +1,153 @@
+import os
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+import sys
+import time
+import zlib
+import struct
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from procedural_noise import fbm
+from generate_noise_image import NOISE_SCALE, OCTAVES
+
+
+DEFAULT_TILE = 512
+DEFAULT_LAYERS = 4
+PNG_ROW_BATCH = 64
+
+# Height (0..1) -> colour stops, interpolated per channel.
+LANDSCAPE_PALETTE = (
+    (0.00, (10, 30, 90)),
+    (0.35, (30, 80, 160)),
+    (0.42, (70, 130, 200)),
+    (0.45, (220, 210, 150)),
+    (0.50, (90, 160, 60)),
+    (0.65, (40, 110, 40)),
+    (0.78, (110, 100, 90)),
+    (0.90, (170, 165, 160)),
+    (1.00, (250, 250, 250)),
+)
+
+render_options = None
+
+
+def init_worker(options):
+    global render_options
+    render_options = options
+
+
+def sample_heights(x0, y0, width, height, seed, scale, octaves, layers):
+    xs = (np.arange(x0, x0 + width) / (scale * 2))[np.newaxis, :]
+    ys = (np.arange(y0, y0 + height) / (scale * 2))[:, np.newaxis]
+    # Same mapping the game uses for platform heights: noise + 0.5, clamped.
+    return np.clip(fbm(xs, ys, seed, frequency=octaves, layers=layers) + 0.5, 0.0, 1.0).astype(np.float32)
+
+
+def colorize(heights):
+    stops = np.array([stop for stop, _ in LANDSCAPE_PALETTE])
+    colors = np.array([color for _, color in LANDSCAPE_PALETTE], dtype=np.float64)
+    rgb = np.empty(heights.shape + (3,), dtype=np.uint8)
+    for channel in range(3):
+        rgb[..., channel] = np.interp(heights, stops, colors[:, channel]).astype(np.uint8)
+    return rgb
+
+
+def render_tile(tile):
+    x0, y0, width, height = tile
+    options = render_options
+    heights = sample_heights(x0, y0, width, height, options['seed'], options['scale'], options['octaves'], options['layers'])
+
+    height_map = np.load(options['height_path'], mmap_mode='r+')
+    height_map[y0:y0 + height, x0:x0 + width] = heights
+    height_map.flush()
+
+    if options['rgb_path']:
+        rgb_map = np.load(options['rgb_path'], mmap_mode='r+')
+        rgb_map[y0:y0 + height, x0:x0 + width] = colorize(heights)
+        rgb_map.flush()
+    return tile
+
+
+def tiles(width, height, tile_size):
+    for y0 in range(0, height, tile_size):
+        for x0 in range(0, width, tile_size):
+            yield x0, y0, min(tile_size, width - x0), min(tile_size, height - y0)
+
+
+def write_png_chunk(f, tag, data):
+    f.write(struct.pack('>I', len(data)))
+    f.write(tag)
+    f.write(data)
+    f.write(struct.pack('>I', zlib.crc32(tag + data) & 0xFFFFFFFF))
+
+
+def write_png(path, rgb):
+    height, width, _ = rgb.shape
+    compressor = zlib.compressobj(6)
+    with open(path, 'wb') as f:
+        f.write(b'\x89PNG\r\n\x1a\n')
+        write_png_chunk(f, b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+        # Rows are streamed from the memmap a batch at a time, each prefixed
+        # with filter type 0.
+        for y0 in range(0, height, PNG_ROW_BATCH):
+            rows = rgb[y0:y0 + PNG_ROW_BATCH]
+            raw = np.zeros((len(rows), 1 + width * 3), dtype=np.uint8)
+            raw[:, 1:] = rows.reshape(len(rows), -1)
+            data = compressor.compress(raw.tobytes())
+            if data:
+                write_png_chunk(f, b'IDAT', data)
+        write_png_chunk(f, b'IDAT', compressor.flush())
+        write_png_chunk(f, b'IEND', b'')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render a 2D noise heightmap and landscape image in parallel tiles.")
+    parser.add_argument("width", type=int)
+    parser.add_argument("height", type=int)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--scale", type=float, default=NOISE_SCALE, help="noise scale, as NOISE_SCALE in the game")
+    parser.add_argument("--octaves", type=float, default=OCTAVES, help="base frequency, as OCTAVES in the game")
+    parser.add_argument("--layers", type=int, default=DEFAULT_LAYERS, help="fBm layers")
+    parser.add_argument("--tile", type=int, default=DEFAULT_TILE, help="tile edge in pixels")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="worker processes")
+    parser.add_argument("--output", default="heightmap", help="output path prefix")
+    parser.add_argument("--no-png", action="store_true", help="only write the float32 heightmap")
+    parser.add_argument("--keep-rgb", action="store_true", help="keep the colorized RGB array next to the PNG")
+    args = parser.parse_args()
+
+    height_path = f"{args.output}_height.npy"
+    rgb_path = None if args.no_png else f"{args.output}_rgb.npy"
+    np.lib.format.open_memmap(height_path, mode='w+', dtype=np.float32, shape=(args.height, args.width)).flush()
+    if rgb_path:
+        np.lib.format.open_memmap(rgb_path, mode='w+', dtype=np.uint8, shape=(args.height, args.width, 3)).flush()
+
+    options = {
+        'seed': args.seed,
+        'scale': args.scale,
+        'octaves': args.octaves,
+        'layers': args.layers,
+        'height_path': height_path,
+        'rgb_path': rgb_path,
+    }
+    tile_list = list(tiles(args.width, args.height, args.tile))
+
+    start_time = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=init_worker, initargs=(options,)) as executor:
+        for _ in executor.map(render_tile, tile_list):
+            pass
+    elapsed = time.perf_counter() - start_time
+    print(f"Rendered {len(tile_list)} tiles of {args.width}x{args.height} in {elapsed:.2f}s -> {height_path}", file=sys.stderr)
+
+    if rgb_path:
+        png_path = f"{args.output}.png"
+        write_png(png_path, np.load(rgb_path, mmap_mode='r'))
+        if not args.keep_rgb:
+            os.remove(rgb_path)
+        print(f"Wrote {png_path}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()